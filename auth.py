@@ -0,0 +1,140 @@
+import threading
+import time
+import uuid
+from functools import wraps
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from cache import LRUBackend, RedisBackend
+from utils import error_response
+
+# Endpoints that must stay reachable without a token when AUTH_REQUIRED is on
+PUBLIC_ENDPOINTS = {"users.login", "users.register", "index"}
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class RevocationList:
+    """
+    Ids (jti) of tokens revoked before they expire. Entries are dropped
+    once the token would have expired anyway, so the list stays small.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self.shared = None
+
+    def add(self, jti, expires_at):
+        now = time.time()
+        with self._lock:
+            for key in [key for key, expires in self._revoked.items() if expires <= now]:
+                del self._revoked[key]
+            self._revoked[jti] = expires_at
+        if self.shared is not None:
+            self.shared.set(f"revoked:{jti}", 1, max(int(expires_at - time.time()) + 1, 1))
+
+    def __contains__(self, jti):
+        if self._revoked.get(jti, 0) > time.time():
+            return True
+        return self.shared is not None and self.shared.get(f"revoked:{jti}") is not None
+
+
+class TokenAuth:
+    """
+    Signed, expiring access tokens issued on login.
+
+    A token is an itsdangerous signature over the user id and a random token
+    id, so verifying it is one HMAC check with no database query. Recently
+    verified tokens are kept in a small LRU so repeat requests skip even
+    that. Logout adds the token id to a revocation list; with
+    CACHE_TYPE="redis" the list is shared by every worker, otherwise a
+    revoked token is only rejected by the worker that revoked it.
+    """
+
+    def __init__(self):
+        self.serializer = None
+        self.max_age = None
+        self.verified = LRUBackend()
+        self.revoked = RevocationList()
+
+    def init_app(self, app):
+        app.config.setdefault("TOKEN_MAX_AGE", 3600)
+        app.config.setdefault("TOKEN_CACHE_SIZE", 1024)
+        app.config.setdefault("AUTH_REQUIRED", False)
+
+        self.serializer = URLSafeTimedSerializer(app.config["SECRET_KEY"], salt="access-token")
+        self.max_age = app.config["TOKEN_MAX_AGE"]
+        self.verified = LRUBackend(app.config["TOKEN_CACHE_SIZE"])
+
+        cache = app.extensions.get("cache")
+        if cache is not None and isinstance(cache.backend, RedisBackend):
+            self.revoked.shared = cache.backend
+
+        app.extensions["auth"] = self
+        if app.config["AUTH_REQUIRED"]:
+            app.before_request(self._require_token_for_writes)
+
+    def issue(self, user_id):
+        """
+        Return a new access token for the user.
+        """
+        return self.serializer.dumps({"uid": user_id, "jti": uuid.uuid4().hex})
+
+    def verify(self, token):
+        """
+        Return (user_id, jti, expires_at) for a valid token, or None.
+        """
+        claims = self.verified.get(token)
+        if claims is None:
+            try:
+                payload, issued = self.serializer.loads(token, max_age=self.max_age, return_timestamp=True)
+                claims = (int(payload["uid"]), payload["jti"], issued.timestamp() + self.max_age)
+            except (SignatureExpired, BadSignature, KeyError, TypeError, ValueError):
+                return None
+            self.verified.set(token, claims, timeout=max(claims[2] - time.time(), 0.001))
+
+        if claims[1] in self.revoked:
+            return None
+        return claims
+
+    def revoke(self, jti, expires_at):
+        self.revoked.add(jti, expires_at)
+
+    def authenticate(self):
+        """
+        Verify the request's bearer token and store its claims on `g`.
+        Return an error response if it is missing or invalid.
+        """
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return error_response("Missing bearer token", 401)
+        claims = self.verify(token.strip())
+        if claims is None:
+            return error_response("Invalid or expired token", 401)
+        g.user_id, g.token_id, g.token_expires_at = claims
+        return None
+
+    def _require_token_for_writes(self):
+        if request.method in SAFE_METHODS or request.endpoint in PUBLIC_ENDPOINTS or request.endpoint is None:
+            return None
+        return self.authenticate()
+
+
+def login_required(view):
+    """
+    Reject requests without a valid bearer token; g.user_id is set otherwise.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.get("user_id") is None:
+            failed = current_app.extensions["auth"].authenticate()
+            if failed is not None:
+                return failed
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+auth = TokenAuth()
@@ -0,0 +1,4 @@
+"""
+Benchmark harness: seed a dataset (bench.seed), replay read traffic against it
+(bench.driver) and compare the JSON reports of two runs (bench.compare).
+"""
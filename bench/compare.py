@@ -0,0 +1,49 @@
+"""
+Compare two driver reports route by route.
+
+    python -m bench.compare before.json after.json
+
+Prints throughput and p50/p95/p99 for both runs with the relative change;
+negative latency deltas and positive throughput deltas are improvements.
+"""
+import argparse
+import json
+
+
+def delta(old, new):
+    if not old:
+        return "     n/a"
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as fh:
+        before = json.load(fh)
+    with open(args.after) as fh:
+        after = json.load(fh)
+
+    for label, report in (("before", before), ("after", after)):
+        meta = report["meta"]
+        print(f"{label:<7} {meta.get('commit') or '?':.12}  {meta['target']}  "
+              f"{meta.get('database', '')}  {meta.get('label') or ''}")
+    print()
+    print(f"{'route':<30} {'metric':<8} {'before':>10} {'after':>10} {'change':>8}")
+
+    for route in sorted(set(before["routes"]) & set(after["routes"])):
+        old, new = before["routes"][route], after["routes"][route]
+        rows = [("req/s", old["throughput_rps"], new["throughput_rps"])]
+        rows += [(f"{p} ms", old["latency_ms"][p], new["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+        for i, (metric, a, b) in enumerate(rows):
+            print(f"{route if i == 0 else '':<30} {metric:<8} {a:>10} {b:>10} {delta(a, b)}")
+
+    for route in sorted(set(before["routes"]) ^ set(after["routes"])):
+        print(f"{route:<30} only in {'before' if route in before['routes'] else 'after'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Measure the CPU cost and size of each response encoding on real entry
+payloads.
+
+    python -m bench.compression                        # pages from DATABASE_URL
+    python -m bench.compression --file page.json       # a saved response, e.g. from production
+    python -m bench.compression --output compression.json
+
+Payloads are /entries/ pages of each --limit and the first --stream-rows rows
+of the NDJSON export, fetched in-process with compression off. Each payload
+is compressed with every encoding and level through the same encoders the
+app uses; streamed payloads go through compress_stream line by line with
+the configured flush size. The seeded dataset uses a small vocabulary, so
+its ratios are better than real journal text will give: use --file with a
+production response to size the trade-off.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import zlib
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 6, 11)
+
+
+def load_payloads(limits, stream_rows):
+    os.environ["COMPRESSION_ENABLED"] = "0"
+    os.environ["CACHE_TYPE"] = "null"
+    os.environ["RATELIMIT_ENABLED"] = "0"
+    from main import app
+
+    client = app.test_client()
+    payloads = {}
+    for limit in limits:
+        response = client.get(f"/entries/?limit={limit}")
+        if response.status_code != 200:
+            raise SystemExit(f"GET /entries/ returned {response.status_code}; is the database seeded?")
+        payloads[f"entries page limit={limit}"] = (response.get_data(), False)
+
+    response = client.get("/entries/?stream=1", buffered=False)
+    lines = []
+    for chunk in response.response:
+        lines.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+        if len(lines) >= stream_rows:
+            break
+    response.close()
+    payloads[f"entries ndjson {len(lines)} rows"] = (lines, True)
+    return payloads
+
+
+def time_it(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return result, statistics.median(samples)
+
+
+def measure(payload, streamed, encoding, level, flush_bytes, repeat):
+    from compression import ENCODERS, compress, compress_stream
+
+    if streamed:
+        raw = b"".join(payload)
+        encode = lambda: b"".join(compress_stream(payload, ENCODERS[encoding](level), flush_bytes))
+    else:
+        raw = payload
+        encode = lambda: compress(encoding, payload, level)
+    body, seconds = time_it(encode, repeat)
+
+    if encoding == "gzip":
+        decode = lambda: zlib.decompress(body, 31)
+    else:
+        import brotli
+        decode = lambda: brotli.decompress(body)
+    decoded, decode_seconds = time_it(decode, repeat)
+    assert decoded == raw
+    return {
+        "bytes": len(body),
+        "ratio": round(len(raw) / len(body), 2),
+        "compress_ms": round(seconds * 1000, 3),
+        "compress_mb_s": round(len(raw) / seconds / 1e6, 1),
+        "decompress_ms": round(decode_seconds * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limits", default="50,500", help="comma-separated /entries/ page sizes")
+    parser.add_argument("--stream-rows", type=int, default=5000, help="NDJSON rows to compress as a stream")
+    parser.add_argument("--file", action="append", default=[], help="benchmark a saved response body instead")
+    parser.add_argument("--flush-bytes", type=int, default=16384, help="streamed input between flushes")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    from compression import available_encodings
+
+    if args.file:
+        payloads = {}
+        for path in args.file:
+            with open(path, "rb") as fh:
+                payloads[os.path.basename(path)] = (fh.read(), False)
+    else:
+        payloads = load_payloads([int(limit) for limit in args.limits.split(",")], args.stream_rows)
+
+    codecs = [("gzip", level) for level in GZIP_LEVELS]
+    if "br" in available_encodings():
+        codecs += [("br", quality) for quality in BROTLI_QUALITIES]
+    else:
+        print("brotli is not installed; measuring gzip only", file=sys.stderr)
+
+    report = {"flush_bytes": args.flush_bytes, "payloads": {}}
+    for name, (payload, streamed) in payloads.items():
+        size = sum(len(line) for line in payload) if streamed else len(payload)
+        results = {}
+        print(f"\n{name}: {size} bytes", file=sys.stderr)
+        for encoding, level in codecs:
+            result = measure(payload, streamed, encoding, level, args.flush_bytes, args.repeat)
+            results[f"{encoding}-{level}"] = result
+            print(f"  {encoding:<4} {level:>2}  {result['bytes']:>10} bytes  x{result['ratio']:<6} "
+                  f"{result['compress_ms']:>9} ms  {result['compress_mb_s']:>7} MB/s  "
+                  f"decompress {result['decompress_ms']} ms", file=sys.stderr)
+        report["payloads"][name] = {"bytes": size, "streamed": streamed, "encodings": results}
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
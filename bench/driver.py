@@ -0,0 +1,261 @@
+"""
+Replay read traffic against every blueprint and report throughput and
+latency percentiles per route as JSON.
+
+    python -m bench.driver --output before.json                  # in-process (Flask test client)
+    python -m bench.driver --target http://127.0.0.1:5000 --concurrency 16 --output gunicorn.json
+
+In-process runs use the database from DATABASE_URL; --no-cache disables the
+response cache so every request reaches the database. Rate limits are off
+in-process unless --ratelimit is given, since every request comes from one
+client. Request ids are
+sampled from the API itself with a fixed random seed, so two runs against
+the same dataset issue the same requests. --include-writes adds
+create/update/delete workloads, which change the dataset.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+ROUTES = (
+    ("users.list_users", "/users/?limit=50"),
+    ("trips.list_trips", "/trips/?limit=50"),
+    ("trips.get_trip", "/trips/{trip}"),
+    ("trips.get_trip_expanded", "/trips/{trip}?expand=entries,photos,users"),
+    ("trips.list_trip_entries", "/trips/{trip}/entries?limit=50"),
+    ("trips.list_trip_users", "/trips/{trip}/users"),
+    ("entries.list_entries", "/entries/?limit=50"),
+    ("entries.list_entries_by_trip", "/entries/?trip_id={trip}&limit=50"),
+    ("entries.get_entry", "/entries/{entry}"),
+    ("photos.list_photos", "/photos/?limit=50"),
+    ("photos.get_photo", "/photos/{photo}"),
+)
+WRITE_ROUTES = (
+    ("trips.create_trip", "POST", "/trips/"),
+    ("entries.create_entry", "POST", "/entries/"),
+    ("entries.update_entry", "PUT", "/entries/{entry}"),
+    ("users.login", "POST", "/users/login"),
+)
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HTTPClient:
+    """
+    One keep-alive connection per worker thread.
+    """
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def request(self, method, path, body=None):
+        headers, payload = {}, None
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            payload = json.dumps(body)
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+
+
+def sample_ids(client, resource, count, rng):
+    """
+    Collect up to `count` ids of a resource by paging through its list endpoint.
+    """
+    ids, path = [], f"/{resource}/?limit=500"
+    while len(ids) < count * 4:
+        status, body = client.request("GET", path)
+        if status != 200:
+            raise SystemExit(f"GET {path} returned {status}; is the database seeded?")
+        raw = json.loads(body)
+        ids += [item["id"] for item in raw[resource]]
+        if not raw["next_cursor"]:
+            break
+        path = f"/{resource}/?limit=500&after={raw['next_cursor']}"
+    rng.shuffle(ids)
+    return ids[:count] or [1]
+
+
+def run_route(make_client, calls, concurrency):
+    """
+    Issue every (method, path, body) call once across `concurrency` threads;
+    return (latencies in seconds, error count, wall time).
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    queue = list(reversed(calls))
+
+    def worker():
+        client = make_client()
+        local, local_errors = [], 0
+        while True:
+            with lock:
+                if not queue:
+                    break
+                method, path, body = queue.pop()
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body)
+                ok = status < 400
+            except Exception:
+                ok = False
+            local.append(time.perf_counter() - start)
+            local_errors += int(not ok)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def summarize(latencies, errors, wall):
+    from instrumentation import percentile
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 3),
+            "p95": round(percentile(ordered, 95) * 1000, 3),
+            "p99": round(percentile(ordered, 99) * 1000, 3),
+            "mean": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="inprocess", help="'inprocess' or a base URL such as http://127.0.0.1:5000")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--routes", help="comma-separated route names to run (default: all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-cache", action="store_true", help="in-process only: set CACHE_TYPE=null")
+    parser.add_argument("--ratelimit", action="store_true", help="in-process only: keep RATELIMITS enforced")
+    parser.add_argument("--include-writes", action="store_true", help="also run create/update/login workloads")
+    parser.add_argument("--label", help="free-form label stored in the report, e.g. 'postgres-16'")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    meta = {
+        "target": args.target,
+        "commit": git_commit(),
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "concurrency": args.concurrency,
+        "requests_per_route": args.requests,
+    }
+
+    if args.target == "inprocess":
+        if args.no_cache:
+            os.environ["CACHE_TYPE"] = "null"
+        if not args.ratelimit:
+            os.environ["RATELIMIT_ENABLED"] = "0"
+        from main import app
+        from extensions import db
+
+        with app.app_context():
+            meta["database"] = db.engine.dialect.name
+        meta["cache"] = app.config["CACHE_TYPE"]
+        meta["ratelimit"] = app.config["RATELIMIT_ENABLED"]
+        make_client = lambda: InProcessClient(app)
+    else:
+        make_client = lambda: HTTPClient(args.target)
+
+    rng = random.Random(args.seed)
+    sampler = make_client()
+    ids = {
+        "trip": sample_ids(sampler, "trips", 200, rng),
+        "entry": sample_ids(sampler, "entries", 200, rng),
+        "photo": sample_ids(sampler, "photos", 200, rng),
+    }
+
+    def pick(template):
+        return template.format(trip=rng.choice(ids["trip"]), entry=rng.choice(ids["entry"]),
+                               photo=rng.choice(ids["photo"]))
+
+    def write_body(name, n):
+        if name == "trips.create_trip":
+            return {"title": f"Bench trip {n}", "start_date": "2026-01-01", "end_date": "2026-01-10",
+                    "location": "Osaka"}
+        if name == "entries.create_entry":
+            return {"trip_id": rng.choice(ids["trip"]), "date": "2026-01-02", "title": f"Bench {n}", "content": "bench"}
+        if name == "entries.update_entry":
+            return {"title": f"Bench update {n}"}
+        # Seeded users all share the password "benchmark".
+        return {"username": login_user, "password": "benchmark"}
+
+    workloads = [(name, [("GET", pick(template), None) for _ in range(args.warmup + args.requests)])
+                 for name, template in ROUTES]
+    if args.include_writes:
+        status, body = sampler.request("GET", "/users/?limit=1")
+        login_user = json.loads(body)["users"][0]["username"]
+        for name, method, template in WRITE_ROUTES:
+            calls = [(method, pick(template), write_body(name, n)) for n in range(args.warmup + args.requests)]
+            workloads.append((name, calls))
+
+    selected = set(args.routes.split(",")) if args.routes else None
+    report = {"meta": meta, "routes": {}}
+    for name, calls in workloads:
+        if selected and name not in selected:
+            continue
+        run_route(make_client, calls[:args.warmup], args.concurrency)
+        result = summarize(*run_route(make_client, calls[args.warmup:], args.concurrency))
+        report["routes"][name] = result
+        print(f"{name:<30} {result['throughput_rps']:>9} req/s  p95 {result['latency_ms']['p95']:>8} ms  "
+              f"errors {result['errors']}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Seed the configured database (DATABASE_URL) with a reproducible dataset.
+
+    python -m bench.seed --entries 100000
+
+--entries is the scale knob (10k to 10M); the other tables are derived from
+it: 1 user per 100 entries, 1 trip per 20 entries, 2 travellers per trip
+and --photos-per-entry photos per entry. Rows are generated lazily and
+written with executemany in chunks, so memory stays flat at any scale.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from sqlalchemy import func, insert, text
+
+WORDS = (
+    "ramen market temple harbour castle museum ferry trail beach sunset noodle "
+    "station garden alley bridge festival coffee mountain river night lantern "
+    "street food shrine tower gallery park island village hostel train"
+).split()
+PLACES = (
+    "Osaka", "Tokyo", "Kyoto", "Lisbon", "Porto", "Paris", "Rome", "Berlin",
+    "Barcelona", "Seoul", "Bangkok", "Hanoi", "Sydney", "Auckland", "Lima",
+    "Mexico City", "New York", "Vancouver", "Reykjavik", "Istanbul",
+)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def plan(entries, photos_per_entry):
+    return {
+        "users": max(entries // 100, 1),
+        "trips": max(entries // 20, 1),
+        "entries": entries,
+        "photos": int(entries * photos_per_entry),
+    }
+
+
+def seed(entries, photos_per_entry=0.5, chunk_size=5000, random_seed=42, out=sys.stdout):
+    from extensions import db
+    from models import User, Trip, UserTrip, Entry, Photo
+    from geo import geocoded, located
+
+    counts = plan(entries, photos_per_entry)
+    rng = random.Random(random_seed)
+    # Photo coordinates come from their own generator so the rest of the
+    # dataset is the same as before they existed.
+    geo_rng = random.Random(random_seed + 1)
+    places = {place: geocoded(place) for place in PLACES}
+    # Explicit ids let children reference parents without reading them back.
+    base = {
+        model: (db.session.scalar(db.select(func.max(model.id))) or 0)
+        for model in (User, Trip, UserTrip, Entry, Photo)
+    }
+    # One hash for every user: running the KDF per row would dominate seeding.
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash("benchmark")
+    epoch = date(2015, 1, 1)
+
+    def trip_start(i):
+        # Derived from the index rather than stored, to keep memory flat.
+        return epoch + timedelta(days=(i * 7919) % 3650)
+
+    def users():
+        for i in range(1, counts["users"] + 1):
+            uid = base[User] + i
+            yield {"id": uid, "username": f"bench{uid}", "email": f"bench{uid}@example.com",
+                   "password_hash": password_hash}
+
+    def trips():
+        for i in range(1, counts["trips"] + 1):
+            start = trip_start(i)
+            location = rng.choice(PLACES)
+            yield {"id": base[Trip] + i, "title": sentence(rng, 3).title(), "start_date": start,
+                   "end_date": start + timedelta(days=rng.randrange(1, 30)), "location": location,
+                   **places[location]}
+
+    def user_trips():
+        link_id = base[UserTrip]
+        for i in range(1, counts["trips"] + 1):
+            for user in rng.sample(range(1, counts["users"] + 1), min(2, counts["users"])):
+                link_id += 1
+                yield {"id": link_id, "user_id": base[User] + user, "trip_id": base[Trip] + i}
+
+    def entries_rows():
+        for i in range(1, counts["entries"] + 1):
+            trip = rng.randrange(1, counts["trips"] + 1)
+            yield {"id": base[Entry] + i, "trip_id": base[Trip] + trip,
+                   "date": trip_start(trip) + timedelta(days=rng.randrange(30)),
+                   "title": sentence(rng, 4).capitalize(), "content": sentence(rng, rng.randrange(20, 200))}
+
+    def photos():
+        for i in range(1, counts["photos"] + 1):
+            # Scattered up to ~20 km around one of the places.
+            place = places[geo_rng.choice(PLACES)]
+            point = (place["latitude"] + geo_rng.uniform(-0.2, 0.2), place["longitude"] + geo_rng.uniform(-0.2, 0.2))
+            yield {"id": base[Photo] + i, "entry_id": base[Entry] + rng.randrange(1, counts["entries"] + 1),
+                   "url": f"https://example.com/photos/{base[Photo] + i}.jpg", "caption": sentence(rng, 5),
+                   "latitude": point[0], "longitude": point[1], "geohash": located(point)["geohash"]}
+
+    for model, rows in ((User, users()), (Trip, trips()), (UserTrip, user_trips()),
+                        (Entry, entries_rows()), (Photo, photos())):
+        started, written = time.perf_counter(), 0
+        for chunk in chunked(rows, chunk_size):
+            db.session.execute(insert(model), chunk)
+            db.session.commit()
+            written += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"{model.__tablename__:<11} {written:>10} rows  {elapsed:7.1f}s", file=out)
+
+    import stats
+    started = time.perf_counter()
+    stats.rebuild()
+    print(f"{'trip_stats':<11} {'rebuilt':>10}       {time.perf_counter() - started:7.1f}s", file=out)
+
+    # Bulk inserts bypass the session's change logging; log the seeded rows
+    # so /sync from 0 sees them. INSERT ... SELECT, so ids stay in the database.
+    import changelog
+    started = time.perf_counter()
+    logged = sum(changelog.record_range(model, base[model], chunk_size) for model in (Trip, Entry, Photo))
+    print(f"{'changes':<11} {logged:>10} rows  {time.perf_counter() - started:7.1f}s", file=out)
+
+    if db.engine.dialect.name == "postgresql":
+        # Explicit ids bypass the sequences; move them past the seeded rows.
+        for model in (User, Trip, UserTrip, Entry, Photo):
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            ))
+        db.session.commit()
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=10000, help="number of journal entries (scale knob)")
+    parser.add_argument("--photos-per-entry", type=float, default=0.5)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, same seed gives the same dataset")
+    parser.add_argument("--create-tables", action="store_true",
+                        help="create missing tables with db.create_all() instead of requiring migrations")
+    args = parser.parse_args(argv)
+
+    from main import app
+    from extensions import db
+
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        seed(args.entries, args.photos_per_entry, args.chunk_size, args.seed)
+
+
+if __name__ == "__main__":
+    main()
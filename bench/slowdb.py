@@ -0,0 +1,23 @@
+"""
+WSGI entry point for worker benchmarks: main.app with a fixed delay before
+every SQL statement, standing in for a database on another host.
+
+    BENCH_DB_LATENCY_MS=5 gunicorn -c gunicorn.conf.py bench.slowdb:app
+
+time.sleep is cooperative under gevent, like a psycogreen-patched
+PostgreSQL query, and releases the GIL under gthread, like any socket wait.
+"""
+import os
+import time
+
+from sqlalchemy import event
+
+from main import app
+from extensions import db
+
+LATENCY = float(os.environ.get("BENCH_DB_LATENCY_MS", "5")) / 1000
+
+with app.app_context():
+    @event.listens_for(db.engine, "before_cursor_execute")
+    def simulate_network_latency(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(LATENCY)
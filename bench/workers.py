@@ -0,0 +1,132 @@
+"""
+Compare gunicorn worker configurations on the read endpoints.
+
+    python -m bench.workers --configs sync:3,gthread:2x8,gevent:2x100 --concurrency 32
+    python -m bench.workers --db-latency-ms 5 --output workers.json
+
+Each configuration ("class:workers" or "class:workersxthreads", where the
+second number is threads for gthread and connections for gevent) is started
+with gunicorn.conf.py on a local port and measured with bench.driver over
+HTTP. The response cache and rate limits are off so every request reaches
+the database. --db-latency-ms serves bench.slowdb:app, which delays every
+SQL statement, to model a database across the network; with a local SQLite
+file there is almost no I/O to overlap and the worker classes mostly
+measure their own overhead.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from bench.driver import main as run_driver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_config(spec):
+    worker_class, _, sizes = spec.partition(":")
+    workers, _, per_worker = sizes.partition("x")
+    env = {"GUNICORN_WORKER_CLASS": worker_class}
+    if workers:
+        env["WEB_CONCURRENCY"] = workers
+    if per_worker:
+        env["GUNICORN_THREADS" if worker_class == "gthread" else "GUNICORN_WORKER_CONNECTIONS"] = per_worker
+    return env
+
+
+def wait_until_up(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"gunicorn did not answer on {url} within {timeout}s")
+
+
+def run_config(spec, args):
+    env = dict(os.environ, **parse_config(spec))
+    env.update(
+        GUNICORN_BIND=f"127.0.0.1:{args.port}",
+        CACHE_TYPE="null",
+        RATELIMIT_ENABLED="0",
+        BENCH_DB_LATENCY_MS=str(args.db_latency_ms),
+    )
+    target = "bench.slowdb:app" if args.db_latency_ms else "main:app"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", target],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(url + "/", process)
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            argv = ["--target", url, "--concurrency", str(args.concurrency), "--requests", str(args.requests),
+                    "--warmup", str(args.warmup), "--label", spec, "--output", out.name]
+            if args.routes:
+                argv += ["--routes", args.routes]
+            print(f"\n== {spec}", file=sys.stderr)
+            run_driver(argv)
+            with open(out.name) as fh:
+                return json.load(fh)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def totals(report):
+    routes = report["routes"].values()
+    return {
+        "throughput_rps": round(sum(r["throughput_rps"] for r in routes) / len(routes), 2),
+        "p95_ms": round(sum(r["latency_ms"]["p95"] for r in routes) / len(routes), 3),
+        "errors": sum(r["errors"] for r in routes),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default="sync:3,gthread:2x8,gevent:2x100",
+                        help="comma-separated class:workers[xthreads|xconnections]; the first is the baseline")
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+    parser.add_argument("--requests", type=int, default=300, help="requests per route")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--routes", help="comma-separated route names (default: all read routes)")
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="delay added to every SQL statement")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    reports = {spec: run_config(spec, args) for spec in args.configs.split(",")}
+    summary = {spec: totals(report) for spec, report in reports.items()}
+
+    baseline = summary[next(iter(summary))]["throughput_rps"]
+    print(f"\n{'config':<20} {'req/s (mean per route)':>24} {'vs baseline':>12} {'p95 ms':>10} {'errors':>7}",
+          file=sys.stderr)
+    for spec, row in summary.items():
+        gain = f"{(row['throughput_rps'] / baseline - 1) * 100:+.1f}%" if baseline else "n/a"
+        print(f"{spec:<20} {row['throughput_rps']:>24} {gain:>12} {row['p95_ms']:>10} {row['errors']:>7}",
+              file=sys.stderr)
+
+    text = json.dumps({"db_latency_ms": args.db_latency_ms, "concurrency": args.concurrency,
+                       "summary": summary, "reports": reports}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for CACHE_TYPE="redis"
+    redis = None
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+class NullBackend:
+    """
+    Caches nothing. Used when CACHE_TYPE is "null".
+    """
+
+    def get(self, key):
+        return None
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def set_many(self, mapping, timeout=None):
+        pass
+
+    def add(self, key, value, timeout=None):
+        return True
+
+    def clear(self):
+        pass
+
+
+class LRUBackend:
+    """
+    In-process cache with least-recently-used eviction and a per-key TTL.
+    Only shared by the threads of one worker process.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _set(self, key, value, timeout):
+        expires = time.monotonic() + timeout if timeout else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return [self._get(key, now) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._set(key, value, timeout)
+
+    def set_many(self, mapping, timeout=None):
+        with self._lock:
+            for key, value in mapping.items():
+                self._set(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        with self._lock:
+            if self._get(key, time.monotonic()) is not None:
+                return False
+            self._set(key, value, timeout)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """
+    Shared cache on a Redis-compatible server, so every worker sees the
+    same entries and invalidations.
+    """
+
+    def __init__(self, url, prefix="tj:"):
+        if redis is None:
+            raise RuntimeError("CACHE_TYPE='redis' requires the 'redis' package.")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def get_many(self, keys):
+        raws = self.client.mget([self.prefix + key for key in keys])
+        return [None if raw is None else pickle.loads(raw) for raw in raws]
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=timeout or None)
+
+    def set_many(self, mapping, timeout=None):
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(self.prefix + key, pickle.dumps(value), ex=timeout or None)
+        pipe.execute()
+
+    def add(self, key, value, timeout=None):
+        return bool(self.client.set(self.prefix + key, pickle.dumps(value), ex=timeout or None, nx=True))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+# ----------------------------
+# Flask extension
+# ----------------------------
+class Cache:
+    """
+    Read-through cache of serialized GET responses.
+
+    Every cached view is tagged with the resources it renders ("trips",
+    "trip:42", ...). Each tag has a generation token that is part of the cache
+    key, so invalidating a tag just replaces its token and every response
+    built from the old one becomes unreachable (and ages out of the backend).
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.timeout = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_TYPE", "simple")
+        app.config.setdefault("CACHE_DEFAULT_TIMEOUT", 60)
+        app.config.setdefault("CACHE_MAX_ENTRIES", 2048)
+        app.config.setdefault("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+        cache_type = app.config["CACHE_TYPE"]
+        if cache_type == "simple":
+            self.backend = LRUBackend(app.config["CACHE_MAX_ENTRIES"])
+        elif cache_type == "redis":
+            self.backend = RedisBackend(app.config["CACHE_REDIS_URL"])
+        elif cache_type == "null":
+            self.backend = NullBackend()
+        else:
+            raise RuntimeError(f"Unknown CACHE_TYPE '{cache_type}'.")
+
+        self.timeout = app.config["CACHE_DEFAULT_TIMEOUT"]
+        app.extensions["cache"] = self
+
+    def _generations(self, tags):
+        keys = [f"gen:{tag}" for tag in tags]
+        generations = self.backend.get_many(keys)
+        for i, generation in enumerate(generations):
+            if generation is None:
+                # A fresh token (never a counter reset to 0) keeps responses
+                # cached under an evicted generation from becoming valid again.
+                token = uuid.uuid4().hex
+                self.backend.add(keys[i], token)
+                generations[i] = self.backend.get(keys[i]) or token
+        return generations
+
+    def invalidate(self, *tags):
+        """
+        Drop every cached response tagged with any of the given tags.
+        """
+        if tags:
+            self.backend.set_many({f"gen:{tag}": uuid.uuid4().hex for tag in set(tags)})
+
+    def clear(self):
+        self.backend.clear()
+
+    def cached(self, *tags, unless=None):
+        """
+        Cache the view's 200 responses, keyed on the request path, query string
+        and the current generation of each tag. Tags may use the view's
+        keyword arguments, e.g. "trip:{trip_id}".
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if unless is not None and unless():
+                    return view(**kwargs)
+
+                resolved = [tag.format(**kwargs) for tag in tags]
+                generations = self._generations(resolved)
+                key = f"view:{request.full_path}:{':'.join(generations)}"
+
+                hit = self.backend.get(key)
+                if hit is not None:
+                    body, status, headers = hit
+                    return Response(body, status=status, headers=headers).make_conditional(request)
+
+                response = current_app.make_response(view(**kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    headers = [(k, v) for k, v in response.headers if k not in ("Content-Length", "Set-Cookie")]
+                    self.backend.set(key, (response.get_data(), response.status_code, headers), self.timeout)
+                return response
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,215 @@
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import Select, delete, event, exists, func, insert, literal, select
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import Trip, Entry, Photo, Change, ChangeCompaction, utcnow
+
+SYNCED = {model.__tablename__: model for model in (Trip, Entry, Photo)}
+UPSERT, DELETE = "upsert", "delete"
+
+
+# ----------------------------
+# Recording
+# ----------------------------
+# Rows added, changed or deleted through the session (session.add, attribute
+# changes, session.delete and its cascades) are collected by the after_flush
+# listener. Bulk statements (insert()/update() executemany, Query.delete)
+# bypass the unit of work, so their handlers call record() explicitly, next
+# to their stats.adjust() calls and before commit.
+#
+# Either way the rows wait in session.info and are inserted by the
+# before_commit listener, as the last statement of the transaction. On
+# PostgreSQL, ids come from a sequence in insert order but transactions
+# commit in any order: a reader could see id 11 before 10 commits and skip
+# it. The insert therefore takes a transaction-level advisory lock, which
+# makes ids become visible in order. The lock is taken only at that point,
+# so it is held for the insert and the commit, not for the whole write.
+PENDING = "changelog_pending"
+LOCK_KEY = 0x6368616E6765
+
+
+def _pending(session):
+    return session.info.setdefault(PENDING, [])
+
+
+def _lock(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(select(func.pg_advisory_xact_lock(literal(LOCK_KEY))))
+
+
+def record(table_name, ids, op=UPSERT):
+    """
+    Log a write to rows of a synced table, given as a list of ids or a
+    SELECT of ids (e.g. the photos of entries about to be deleted, which is
+    read now, before they are gone).
+    """
+    if table_name not in SYNCED:
+        raise ValueError(f"'{table_name}' is not a synced table.")
+    if isinstance(ids, Select):
+        # On the connection, so a pending session.delete() is not autoflushed
+        # (and cascaded) before the ids are read.
+        ids = db.session.connection().scalars(ids).all()
+    now = utcnow()
+    _pending(db.session).extend(
+        {"table_name": table_name, "row_id": row_id, "op": op, "changed_at": now}
+        for row_id in dict.fromkeys(ids)
+    )
+
+
+@event.listens_for(db.session, "after_flush")
+def log_flush(session, flush_context):
+    # session.dirty also holds objects whose attributes were set to equal
+    # values; is_modified leaves those out.
+    changed = [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    now = utcnow()
+    rows = []
+    for op, objects in ((UPSERT, session.new), (UPSERT, changed), (DELETE, session.deleted)):
+        for obj in objects:
+            table_name = getattr(obj, "__tablename__", None)
+            if table_name in SYNCED:
+                rows.append({"table_name": table_name, "row_id": obj.id, "op": op, "changed_at": now})
+    if rows:
+        _pending(session).extend(rows)
+
+
+@event.listens_for(db.session, "before_commit")
+def write_log(session):
+    # commit() flushes after this hook runs, so flush here to collect the
+    # last changes first.
+    session.flush()
+    rows = session.info.pop(PENDING, None)
+    if not rows:
+        return
+    connection = session.connection()
+    _lock(connection)
+    connection.execute(insert(Change.__table__), rows)
+
+
+@event.listens_for(db.session, "after_transaction_end")
+def drop_log(session, transaction):
+    # Rolled back (or closed without commit): nothing was written.
+    if transaction.parent is None:
+        session.info.pop(PENDING, None)
+
+
+def record_range(model, after_id, batch_size=5000):
+    """
+    Log every row of a synced table with an id above `after_id` as upserted,
+    for rows bulk-loaded outside the session (bench.seed). Each batch is one
+    INSERT ... SELECT over an id range, committed on its own, so no ids are
+    read into Python. Returns the number of rows logged.
+    """
+    table_name = model.__tablename__
+    if table_name not in SYNCED:
+        raise ValueError(f"'{table_name}' is not a synced table.")
+    last = db.session.scalar(select(func.max(model.id))) or 0
+    logged = 0
+    for start in range(after_id, last, batch_size):
+        source = (
+            select(literal(table_name), model.id, literal(UPSERT), literal(utcnow(), db.DateTime))
+            .where(model.id > start, model.id <= start + batch_size)
+            .order_by(model.id)
+        )
+        connection = db.session.connection()
+        _lock(connection)
+        logged += connection.execute(
+            insert(Change.__table__).from_select(["table_name", "row_id", "op", "changed_at"], source)
+        ).rowcount
+        db.session.commit()
+    return logged
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def horizon():
+    """
+    Oldest token that can still be synced from, besides 0.
+    """
+    return db.session.scalar(select(func.max(ChangeCompaction.through_id))) or 0
+
+
+def changes_since(since, limit):
+    """
+    The next `limit` logged changes after token `since`, collapsed to the
+    latest state of each row: {"trips": {"upserted": [...], "deleted": [...]},
+    ..., "next_since": token, "has_more": bool}. Rows upserted in the log but
+    gone from their table by now are reported as deleted.
+    """
+    log = db.session.execute(
+        select(Change.id, Change.table_name, Change.row_id, Change.op)
+        .where(Change.id > since)
+        .order_by(Change.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(log) > limit
+    log = log[:limit]
+
+    latest = {name: {} for name in SYNCED}
+    for change in log:
+        if change.table_name in latest:
+            latest[change.table_name][change.row_id] = change.op
+
+    result = {}
+    for name, ops in latest.items():
+        model = SYNCED[name]
+        upserted = sorted(row_id for row_id, op in ops.items() if op == UPSERT)
+        rows = []
+        if upserted:
+            rows = model.query.with_entities(*model.json_columns()) \
+                .filter(model.id.in_(upserted)).order_by(model.id).all()
+        found = {row.id for row in rows}
+        result[name] = {
+            "upserted": [model.row_to_dict(row) for row in rows],
+            "deleted": sorted(row_id for row_id in ops if row_id not in found),
+        }
+    result["next_since"] = log[-1].id if log else max(since, 0)
+    result["has_more"] = has_more
+    return result
+
+
+# ----------------------------
+# Compaction
+# ----------------------------
+def compact(tombstone_days):
+    """
+    Drop log rows superseded by a later change to the same row (lossless),
+    then tombstones older than tombstone_days, recording how far they went.
+    Returns (superseded, tombstones) row counts.
+    """
+    later = aliased(Change)
+    superseded = db.session.execute(
+        delete(Change).where(exists().where(
+            later.table_name == Change.table_name, later.row_id == Change.row_id, later.id > Change.id
+        ))
+    ).rowcount
+
+    tombstones = 0
+    cutoff = utcnow() - timedelta(days=tombstone_days)
+    through = db.session.scalar(select(func.max(Change.id)).where(Change.op == DELETE, Change.changed_at < cutoff))
+    if through is not None:
+        tombstones = db.session.execute(
+            delete(Change).where(Change.op == DELETE, Change.id <= through)
+        ).rowcount
+        db.session.add(ChangeCompaction(through_id=through))
+    db.session.commit()
+    return superseded, tombstones
+
+
+sync_cli = AppGroup("sync", help="Maintain the change log behind /sync.")
+
+
+@sync_cli.command("compact")
+@click.option("--tombstone-days", type=int, default=None,
+              help="Drop tombstones older than this many days (default SYNC_TOMBSTONE_DAYS).")
+def compact_command(tombstone_days):
+    """Remove superseded changes and old tombstones."""
+    if tombstone_days is None:
+        tombstone_days = current_app.config["SYNC_TOMBSTONE_DAYS"]
+    superseded, tombstones = compact(tombstone_days)
+    click.echo(f"Removed {superseded} superseded changes and {tombstones} tombstones.")
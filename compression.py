@@ -0,0 +1,215 @@
+import hashlib
+import re
+import zlib
+
+from flask import g, request
+
+from cache import LRUBackend
+
+try:
+    import brotli
+except ImportError:  # optional dependency, gzip is used without it
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json", "application/x-ndjson", "text/plain", "text/html", "text/csv",
+}
+ETAG_SUFFIX_RE = re.compile(r'-(?:br|gzip)"')
+
+
+# ----------------------------
+# Encoders
+# ----------------------------
+class GzipEncoder:
+    def __init__(self, level=6):
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._zlib.compress(data)
+
+    def flush(self):
+        # Z_SYNC_FLUSH ends on a byte boundary, so the client can decode
+        # everything sent so far, without ending the stream.
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self, quality=4):
+        self._brotli = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._brotli.process(data)
+
+    def flush(self):
+        return self._brotli.flush()
+
+    def finish(self):
+        return self._brotli.finish()
+
+
+ENCODERS = {"br": BrotliEncoder, "gzip": GzipEncoder}
+
+
+def available_encodings():
+    return [name for name in ENCODERS if name != "br" or brotli is not None]
+
+
+def compress(encoding, data, level):
+    encoder = ENCODERS[encoding](level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def compress_stream(chunks, encoder, flush_bytes, close=None):
+    """
+    Compress an iterable of byte chunks as it is produced. Output is
+    flushed whenever `flush_bytes` of input went in since the last flush,
+    so the client keeps receiving data without one flush per small chunk
+    (which would defeat compression on NDJSON lines).
+    """
+    pending = 0
+    try:
+        for chunk in chunks:
+            out = encoder.compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_bytes:
+                out += encoder.flush()
+                pending = 0
+            if out:
+                yield out
+        yield encoder.finish()
+    finally:
+        if close is not None:
+            close()
+
+
+# ----------------------------
+# Flask extension
+# ----------------------------
+class ResponseCompressor:
+    """
+    Compresses responses with the best encoding both sides support,
+    brotli (when installed) or gzip, in preference order COMPRESSION_ENCODINGS.
+
+    Bodies shorter than COMPRESSION_MIN_SIZE are sent as they are. Streamed
+    responses (NDJSON exports) are compressed chunk by chunk as they are
+    generated, never buffered. Compressed bodies are kept in a small LRU
+    keyed on a digest of the uncompressed bytes, so cached list pages are
+    not recompressed on every hit, and a body is never served for another.
+
+    Each encoding is its own representation, so its ETag gets a "-gzip" or
+    "-br" suffix. The suffix is stripped from If-None-Match before the views
+    compare it, and added back to the 304.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.encodings = []
+        self.levels = {}
+        self.min_size = 1024
+        self.flush_bytes = 16384
+        self.memo = None
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESSION_ENABLED", True)
+        app.config.setdefault("COMPRESSION_ENCODINGS", "br,gzip")
+        app.config.setdefault("COMPRESSION_MIN_SIZE", 1024)
+        app.config.setdefault("COMPRESSION_GZIP_LEVEL", 6)
+        app.config.setdefault("COMPRESSION_BROTLI_QUALITY", 4)
+        app.config.setdefault("COMPRESSION_STREAM_FLUSH_BYTES", 16384)
+        app.config.setdefault("COMPRESSION_CACHE_SIZE", 256)
+        app.extensions["compression"] = self
+
+        self.enabled = app.config["COMPRESSION_ENABLED"]
+        configured = [name.strip() for name in app.config["COMPRESSION_ENCODINGS"].split(",") if name.strip()]
+        unknown = [name for name in configured if name not in ENCODERS]
+        if unknown:
+            raise RuntimeError(f"Unknown COMPRESSION_ENCODINGS {', '.join(unknown)}.")
+        self.encodings = [name for name in configured if name in available_encodings()]
+        if not self.enabled or not self.encodings:
+            return
+
+        self.levels = {"gzip": app.config["COMPRESSION_GZIP_LEVEL"], "br": app.config["COMPRESSION_BROTLI_QUALITY"]}
+        self.min_size = app.config["COMPRESSION_MIN_SIZE"]
+        self.flush_bytes = app.config["COMPRESSION_STREAM_FLUSH_BYTES"]
+        self.memo = LRUBackend(app.config["COMPRESSION_CACHE_SIZE"]) if app.config["COMPRESSION_CACHE_SIZE"] else None
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def negotiate(self):
+        """
+        The encoding to use for this request, or None for identity.
+        """
+        accepted = request.accept_encodings
+        best, best_quality = None, 0
+        for name in self.encodings:
+            quality = accepted.quality(name)
+            if quality > best_quality:
+                best, best_quality = name, quality
+        return best
+
+    def _before_request(self):
+        header = request.headers.get("If-None-Match")
+        if header and ETAG_SUFFIX_RE.search(header):
+            g._if_none_match = header
+            request.environ["HTTP_IF_NONE_MATCH"] = ETAG_SUFFIX_RE.sub('"', header)
+
+    def _after_request(self, response):
+        if response.status_code == 304:
+            return self._not_modified(response)
+        if (
+            response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.status_code < 200
+            or response.status_code in (204, 206)
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        if "Content-Encoding" in response.headers or "no-transform" in response.headers.get("Cache-Control", ""):
+            return response
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            encoder = ENCODERS[encoding](self.levels[encoding])
+            iterable = response.response
+            response.response = compress_stream(
+                response.iter_encoded(), encoder, self.flush_bytes, getattr(iterable, "close", None)
+            )
+            response.headers.pop("Content-Length", None)
+            response.direct_passthrough = False
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            etag, weak = response.get_etag()
+            key = f"{encoding}:{hashlib.sha1(data).hexdigest()}" if self.memo else None
+            body = self.memo.get(key) if key else None
+            if body is None:
+                body = compress(encoding, data, self.levels[encoding])
+                if key:
+                    self.memo.set(key, body)
+            response.set_data(body)
+            if etag:
+                response.set_etag(f"{etag}-{encoding}", weak)
+
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def _not_modified(self, response):
+        response.vary.add("Accept-Encoding")
+        original = g.pop("_if_none_match", None)
+        etag, weak = response.get_etag()
+        if original and etag:
+            for encoding in self.encodings:
+                if f'"{etag}-{encoding}"' in original:
+                    response.set_etag(f"{etag}-{encoding}", weak)
+                    break
+        return response
+
+
+compressor = ResponseCompressor()
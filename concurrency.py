@@ -0,0 +1,28 @@
+# Helpers for code that must behave under every gunicorn worker class
+# (see gunicorn.conf.py).
+
+
+def gevent_patched():
+    """
+    True inside a gevent worker, where threading has been monkey-patched and
+    "threads" are greenlets sharing one OS thread.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def run_cpu_bound(fn, *args):
+    """
+    Call fn(*args). In a gevent worker it runs on the hub's pool of native
+    threads, so a long computation (a KDF, decoding an image) does not stall
+    every other request of the worker; elsewhere it runs in the caller's
+    thread. fn must not touch the database or other greenlet-owned state.
+    """
+    if gevent_patched():
+        import gevent
+
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
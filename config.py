@@ -5,6 +5,27 @@ load_dotenv()
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def env_bool(name, default):
+    return os.environ.get(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+
+def engine_options(uri):
+    """
+    SQLAlchemy engine options from the environment. Pool sizing only applies
+    to server databases; SQLite is tuned with PRAGMAs on connect instead.
+    """
+    options = {"pool_pre_ping": env_bool("DB_POOL_PRE_PING", True)}
+    if not uri.startswith("sqlite"):
+        options.update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        )
+    return options
+
+
 class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         "DATABASE_URL",
@@ -12,6 +33,96 @@ class Config:
     )
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Applied to every new SQLite connection
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
     SECRET_KEY = os.environ.get("SECRET_KEY", "fallbacksecret")
 
+    # Access tokens issued by /users/login: lifetime in seconds, how many
+    # verified tokens each worker remembers, and whether non-GET requests
+    # need one
+    TOKEN_MAX_AGE = int(os.environ.get("TOKEN_MAX_AGE", "3600"))
+    TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "1024"))
+    AUTH_REQUIRED = env_bool("AUTH_REQUIRED", False)
+
+    # werkzeug hash method, e.g. "scrypt", "scrypt:65536:8:1" or
+    # "pbkdf2:sha256:1000000"; older hashes are upgraded on login.
+    # The KDF runs in a "process" or "thread" pool, or "inline".
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    PASSWORD_HASH_EXECUTOR = os.environ.get("PASSWORD_HASH_EXECUTOR", "process")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+
+    # Uploaded photos: "local" files under PHOTO_STORAGE_PATH (served from
+    # /photos/files) or an "s3" bucket, plus the thumbnail sizes (longest
+    # edge in pixels) made by PHOTO_WORKERS background threads
+    PHOTO_STORAGE = os.environ.get("PHOTO_STORAGE", "local")
+    PHOTO_STORAGE_PATH = os.environ.get("PHOTO_STORAGE_PATH", os.path.join(basedir, "instance", "photos"))
+    PHOTO_S3_BUCKET = os.environ.get("PHOTO_S3_BUCKET")
+    PHOTO_S3_PREFIX = os.environ.get("PHOTO_S3_PREFIX", "")
+    PHOTO_S3_BASE_URL = os.environ.get("PHOTO_S3_BASE_URL")
+    PHOTO_S3_ENDPOINT_URL = os.environ.get("PHOTO_S3_ENDPOINT_URL")
+    PHOTO_MAX_BYTES = int(os.environ.get("PHOTO_MAX_BYTES", str(20 * 1024 * 1024)))
+    PHOTO_THUMBNAIL_SIZES = os.environ.get("PHOTO_THUMBNAIL_SIZES", "160,480,1024")
+    PHOTO_PROCESSING = os.environ.get("PHOTO_PROCESSING", "thread")
+    PHOTO_WORKERS = int(os.environ.get("PHOTO_WORKERS", "2"))
+
+    # Largest array accepted by the /bulk endpoints
+    BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", "1000"))
+
+    # /trips/nearby: search radius in km when none is given, the largest
+    # accepted, and the most trips returned
+    NEARBY_DEFAULT_RADIUS_KM = float(os.environ.get("NEARBY_DEFAULT_RADIUS_KM", "50"))
+    NEARBY_MAX_RADIUS_KM = float(os.environ.get("NEARBY_MAX_RADIUS_KM", "2000"))
+    NEARBY_MAX_RESULTS = int(os.environ.get("NEARBY_MAX_RESULTS", "100"))
+
+    # /sync: most changes per page, and how long `flask sync compact` keeps
+    # tombstones (clients that last synced earlier must start over)
+    SYNC_PAGE_SIZE = int(os.environ.get("SYNC_PAGE_SIZE", "1000"))
+    SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", "30"))
+
+    # "auto" uses orjson when installed, "default" forces Flask's stdlib provider
+    JSON_PROVIDER = os.environ.get("JSON_PROVIDER", "auto")
+
+    # Response cache: "simple" (in-process LRU), "redis" or "null".
+    # Invalidation is only seen by other workers with the redis backend.
+    CACHE_TYPE = os.environ.get("CACHE_TYPE", "simple")
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get("CACHE_DEFAULT_TIMEOUT", "60"))
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "2048"))
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Token-bucket rate limits: "rule=limit; ..." where a rule is an endpoint,
+    # a blueprint, either prefixed with a method, or "default", and a limit
+    # is "10/minute" or "10/minute burst 30". Buckets live in each worker
+    # ("memory") or are shared through Redis ("redis").
+    RATELIMIT_ENABLED = env_bool("RATELIMIT_ENABLED", True)
+    RATELIMITS = os.environ.get(
+        "RATELIMITS", "users.login=10/minute; users.register=5/minute; POST entries=120/minute"
+    )
+    RATELIMIT_STORAGE = os.environ.get("RATELIMIT_STORAGE", "redis" if CACHE_TYPE == "redis" else "memory")
+    RATELIMIT_REDIS_URL = os.environ.get("RATELIMIT_REDIS_URL", CACHE_REDIS_URL)
+    RATELIMIT_PROXY_COUNT = int(os.environ.get("RATELIMIT_PROXY_COUNT", "0"))
+
+    # Response compression: encodings in preference order ("br" needs the
+    # brotli package), smallest body worth compressing, and how much streamed
+    # output is buffered before a flush
+    COMPRESSION_ENABLED = env_bool("COMPRESSION_ENABLED", True)
+    COMPRESSION_ENCODINGS = os.environ.get("COMPRESSION_ENCODINGS", "br,gzip")
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+    COMPRESSION_STREAM_FLUSH_BYTES = int(os.environ.get("COMPRESSION_STREAM_FLUSH_BYTES", "16384"))
+
     DEBUG = os.environ.get("FLASK_ENV") != "production"
+
+    # /__pool and other internal diagnostics endpoints. Off unless an operator
+    # opts in: they are public and not rate limited.
+    INTERNAL_ENDPOINTS = env_bool("INTERNAL_ENDPOINTS", False)
+
+    # Per-request SQL/serialization timing, Server-Timing headers and /__stats
+    PROFILING_ENABLED = env_bool("PROFILING_ENABLED", False)
+    PROFILING_QUERY_BUDGET = int(os.environ["PROFILING_QUERY_BUDGET"]) if os.environ.get("PROFILING_QUERY_BUDGET") else None
+    PROFILING_ENFORCE_BUDGET = env_bool("PROFILING_ENFORCE_BUDGET", False)
@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from cache import Cache
 
 db = SQLAlchemy()
 migrate = Migrate()
+cache = Cache()
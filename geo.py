@@ -0,0 +1,312 @@
+import csv
+import math
+import os
+import unicodedata
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, bindparam, or_, select, update
+
+from extensions import db, cache
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.csv")
+
+
+# ----------------------------
+# Geohash
+# ----------------------------
+# Points are indexed by their geohash, a base-32 string whose prefixes are
+# nested cells. Every point in a cell shares the cell's prefix, so "points
+# in this cell" is a range scan on an ordinary B-tree index on any database.
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """
+    (height, width) in degrees of a geohash cell of the given length.
+    """
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _successor(cell):
+    """
+    The next cell of the same length in index order, or None after the last.
+    """
+    for i in range(len(cell) - 1, -1, -1):
+        position = BASE32.index(cell[i])
+        if position < len(BASE32) - 1:
+            return cell[:i] + BASE32[position + 1] + BASE32[0] * (len(cell) - i - 1)
+    return None
+
+
+def cover(south, west, north, east, max_cells=24):
+    """
+    Geohash key ranges [(low, high), ...] covering a bounding box that does
+    not cross the antimeridian. Uses the longest cells that keep the box
+    within max_cells of them, then merges cells that are adjacent in index
+    order into one range.
+    """
+    precision = 1
+    for candidate in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(candidate)
+        cells = (math.floor(north / height) - math.floor(south / height) + 1) * \
+                (math.floor(east / width) - math.floor(west / width) + 1)
+        if cells > max_cells:
+            break
+        precision = candidate
+
+    height, width = cell_size(precision)
+    cells = set()
+    lat = south
+    while True:
+        lon = west
+        while True:
+            cells.add(encode(lat, lon, precision))
+            if lon >= east:
+                break
+            lon = min(lon + width, east)
+        if lat >= north:
+            break
+        lat = min(lat + height, north)
+
+    ranges = []
+    for cell in sorted(cells):
+        if ranges and _successor(ranges[-1][1]) == cell:
+            ranges[-1][1] = cell
+        else:
+            ranges.append([cell, cell])
+    pad = BASE32[-1] * (GEOHASH_PRECISION - precision)
+    return [(low, high + pad) for low, high in ranges]
+
+
+def split_bbox(south, west, north, east):
+    """
+    One box, or two when it crosses the antimeridian (west > east).
+    """
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+
+def within_bbox(model, south, west, north, east):
+    """
+    SQL condition for rows of `model` (latitude, longitude, geohash columns)
+    inside the box. The geohash ranges use the index; the coordinate checks
+    trim the parts of the edge cells outside the box.
+    """
+    clauses = []
+    for s, w, n, e in split_bbox(south, west, north, east):
+        ranges = or_(*(model.geohash.between(low, high) for low, high in cover(s, w, n, e)))
+        clauses.append(and_(ranges, model.latitude.between(s, n), model.longitude.between(w, e)))
+    return or_(*clauses)
+
+
+# ----------------------------
+# Distances
+# ----------------------------
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0))
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """
+    (south, west, north, east) enclosing a circle; west > east when it
+    crosses the antimeridian, the full longitude range near the poles.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    if south == -90.0 or north == 90.0:
+        return south, -180.0, north, 180.0
+    dlon = math.degrees(math.asin(min(math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)), 1.0)))
+    if dlon >= 180.0:
+        return south, -180.0, north, 180.0
+    west, east = longitude - dlon, longitude + dlon
+    return south, (west + 540.0) % 360.0 - 180.0, north, (east + 540.0) % 360.0 - 180.0
+
+
+# ----------------------------
+# Parsing
+# ----------------------------
+def parse_coordinates(data):
+    """
+    (latitude, longitude) from a request body, or None when both are absent.
+    Raise ValueError when only one is given or either is out of range.
+    """
+    latitude, longitude = data.get("latitude"), data.get("longitude")
+    if latitude is None and longitude is None:
+        return None
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError("Fields 'latitude' and 'longitude' must both be numbers.")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Latitude must be within [-90, 90] and longitude within [-180, 180].")
+    return latitude, longitude
+
+
+def parse_bbox(value):
+    """
+    (south, west, north, east) from "min_lon,min_lat,max_lon,max_lat", the
+    GeoJSON order. min_lon > max_lon means the box crosses the antimeridian.
+    """
+    try:
+        west, south, east, north = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError("Parameter 'bbox' must be 'min_lon,min_lat,max_lon,max_lat'.")
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("Parameter 'bbox' is outside the valid coordinate range.")
+    return south, west, north, east
+
+
+# ----------------------------
+# Offline geocoding
+# ----------------------------
+def normalize_place(name):
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join("".join(c if c.isalnum() else " " for c in text.casefold()).split())
+
+
+class Gazetteer:
+    """
+    Place names from data/gazetteer.csv (name, country, latitude, longitude,
+    |-separated aliases), loaded on first use. Looks up a free-text trip
+    location with no network access.
+    """
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.path = path
+        self._places = None
+
+    def places(self):
+        if self._places is None:
+            places = {}
+            with open(self.path, newline="", encoding="utf-8") as fh:
+                for row in csv.DictReader(fh):
+                    point = (float(row["latitude"]), float(row["longitude"]))
+                    names = [row["name"], *filter(None, row["aliases"].split("|"))]
+                    for name in names:
+                        places.setdefault(normalize_place(f"{name} {row['country']}"), point)
+                    for name in names:
+                        # First row wins, and the CSV lists larger cities first.
+                        places.setdefault(normalize_place(name), point)
+            self._places = places
+        return self._places
+
+    def geocode(self, location):
+        """
+        (latitude, longitude) of a location like "Kyoto", "Porto, Portugal" or
+        "Old town, Lisbon", or None. Tries the whole string, then each
+        comma-separated part.
+        """
+        if not location:
+            return None
+        places = self.places()
+        candidates = [location, *location.split(",")]
+        for candidate in candidates:
+            point = places.get(normalize_place(candidate))
+            if point is not None:
+                return point
+        return None
+
+
+gazetteer = Gazetteer()
+
+
+def geocoded(location):
+    """
+    Column values (latitude, longitude, geohash) for a trip location.
+    """
+    point = gazetteer.geocode(location)
+    return located(point)
+
+
+def located(point):
+    if point is None:
+        return {"latitude": None, "longitude": None, "geohash": None}
+    return {"latitude": point[0], "longitude": point[1], "geohash": encode(*point)}
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+geo_cli = AppGroup("geo", help="Geocode trips and index coordinates.")
+
+
+@geo_cli.command("backfill")
+@click.option("--regeocode", is_flag=True, help="Geocode every trip again, not only trips without coordinates.")
+@click.option("--batch-size", type=int, default=1000, show_default=True)
+def backfill_command(regeocode, batch_size):
+    """Geocode trips from the gazetteer and fill missing geohashes."""
+    from models import Trip, Photo
+    import changelog
+
+    trips = 0
+    last = 0
+    while True:
+        query = select(Trip.id, Trip.location).where(Trip.id > last).order_by(Trip.id).limit(batch_size)
+        if not regeocode:
+            query = query.where(Trip.latitude.is_(None))
+        rows = db.session.execute(query).all()
+        if not rows:
+            break
+        params = [{"b_id": row.id, **{f"b_{k}": v for k, v in geocoded(row.location).items()}} for row in rows]
+        # Unknown places keep whatever coordinates they have.
+        params = [p for p in params if p["b_latitude"] is not None]
+        if params:
+            db.session.execute(
+                update(Trip.__table__).where(Trip.__table__.c.id == bindparam("b_id")).values(
+                    latitude=bindparam("b_latitude"), longitude=bindparam("b_longitude"),
+                    geohash=bindparam("b_geohash"),
+                ),
+                params,
+            )
+            changelog.record("trips", [p["b_id"] for p in params])
+        db.session.commit()
+        cache.invalidate("trips", *(f"trip:{p['b_id']}" for p in params))
+        trips += len(params)
+        last = rows[-1].id
+
+    photos = 0
+    while True:
+        rows = db.session.execute(
+            select(Photo.id, Photo.latitude, Photo.longitude)
+            .where(Photo.latitude.isnot(None), Photo.longitude.isnot(None), Photo.geohash.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(
+            update(Photo.__table__).where(Photo.__table__.c.id == bindparam("b_id")).values(
+                geohash=bindparam("b_geohash")
+            ),
+            [{"b_id": row.id, "b_geohash": encode(row.latitude, row.longitude)} for row in rows],
+        )
+        db.session.commit()
+        photos += len(rows)
+
+    click.echo(f"Geocoded {trips} trips and indexed {photos} photos.")
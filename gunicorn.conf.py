@@ -0,0 +1,68 @@
+"""
+Gunicorn settings, read from the environment so every deployment (Docker,
+procfile, bench/workers.py) serves the app the same way:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+GUNICORN_WORKER_CLASS picks the serving mode:
+- "gthread" (default): WEB_CONCURRENCY processes x GUNICORN_THREADS threads.
+  A request waiting on the database or a slow client holds one thread, not
+  a whole process.
+- "gevent": WEB_CONCURRENCY processes, each serving up to
+  GUNICORN_WORKER_CONNECTIONS requests on greenlets. Needs gevent, and
+  psycogreen with PostgreSQL so psycopg2 waits cooperatively: both are in
+  requirements-gevent.txt (docker build --build-arg GEVENT=1).
+- "sync": one request per process, the gunicorn default.
+"""
+import multiprocessing
+import os
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in ("sync", "gthread", "gevent"):
+    raise RuntimeError(f"Unknown GUNICORN_WORKER_CLASS '{worker_class}'.")
+if worker_class == "gevent":
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        raise RuntimeError("GUNICORN_WORKER_CLASS=gevent needs: pip install -r requirements-gevent.txt")
+
+_cores = multiprocessing.cpu_count()
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * _cores + 1 if worker_class == "sync" else _cores + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "8")) if worker_class == "gthread" else 1
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "200"))
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0").lower() in ("1", "true", "yes", "on")
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+
+# Every thread or greenlet of a worker may hold a connection while its
+# request runs; size the pool to match unless DB_POOL_SIZE is set.
+if worker_class == "gthread":
+    os.environ.setdefault("DB_POOL_SIZE", str(threads))
+elif worker_class == "gevent":
+    os.environ.setdefault("DB_POOL_SIZE", "20")
+    os.environ.setdefault("DB_MAX_OVERFLOW", "20")
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning("psycogreen is not installed; PostgreSQL queries will block the gevent worker.")
+        else:
+            patch_psycopg()
+
+    if preload_app:
+        # Connections opened by the master while importing the app must not
+        # be shared with the children; close=False leaves them to the parent.
+        from main import app
+        from extensions import db
+
+        with app.app_context():
+            db.engine.dispose(close=False)
@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from extensions import db
+
+
+# ----------------------------
+# Connection pool
+# ----------------------------
+class PoolStats:
+    """
+    Counters for one connection pool. Updated by TimedQueuePool on checkout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_total * 1000, 3),
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+                "wait_ms_avg": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection,
+    which is the direct signal of pool saturation.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return conn
+
+
+def init_pool(app):
+    """
+    Use TimedQueuePool for the engine. Must run before db.init_app, which
+    creates the engine. In-memory SQLite keeps its single-connection pool.
+    """
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if uri in ("sqlite://", "sqlite:///:memory:"):
+        return
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    options.setdefault("poolclass", TimedQueuePool)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def init_sqlite(app):
+    """
+    Apply journal mode, synchronous level and busy timeout to every new
+    SQLite connection, and enforce foreign keys, which SQLite leaves off by
+    default: deletes rely on their ON DELETE CASCADE actions.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = (
+        f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        "PRAGMA foreign_keys=ON",
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def pool_status(engine):
+    """
+    Checked-out, idle and overflow connections plus checkout wait times for
+    the engine's pool in this worker process.
+    """
+    pool = engine.pool
+    status = {"pid": os.getpid(), "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
+
+
+# ----------------------------
+# Per-request profiling
+# ----------------------------
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class RequestProfiler:
+    """
+    Opt-in (PROFILING_ENABLED) per-request instrumentation: SQL statement count
+    and time from cursor events, JSON serialization time, total time and
+    response size. Each response gets a Server-Timing header and the samples
+    are aggregated per endpoint for /__stats.
+
+    PROFILING_QUERY_BUDGET (default) and PROFILING_QUERY_BUDGETS
+    ({endpoint: n}) cap the statements a request may run. Overruns are
+    logged, or raise QueryBudgetExceeded with PROFILING_ENFORCE_BUDGET,
+    which fails the request in tests.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._max_samples = 1000
+        self._samples = defaultdict(lambda: deque(maxlen=self._max_samples))
+
+    def init_app(self, app):
+        app.config.setdefault("PROFILING_ENABLED", False)
+        app.config.setdefault("PROFILING_SAMPLES", 1000)
+        app.config.setdefault("PROFILING_QUERY_BUDGET", None)
+        app.config.setdefault("PROFILING_QUERY_BUDGETS", {})
+        app.config.setdefault("PROFILING_ENFORCE_BUDGET", False)
+        app.extensions["profiler"] = self
+
+        self.enabled = app.config["PROFILING_ENABLED"]
+        if not self.enabled:
+            return
+
+        self._max_samples = app.config["PROFILING_SAMPLES"]
+        self._config = app.config
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+        # The provider's response() may call its own dumps(); _timed only
+        # counts the outermost call so nothing is measured twice.
+        for name in ("dumps", "response"):
+            setattr(app.json, name, self._timed(getattr(app.json, name)))
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _current():
+        if not has_app_context():
+            return None
+        return g.get("_profile")
+
+    def _before_request(self):
+        g._profile = {"start": time.perf_counter(), "queries": 0, "db": 0.0, "ser": 0.0, "ser_depth": 0}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_profile_query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["_profile_query_start"].pop()
+        profile = self._current()
+        if profile is not None:
+            profile["queries"] += 1
+            profile["db"] += time.perf_counter() - started
+
+    def _timed(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = self._current()
+            if profile is None:
+                return func(*args, **kwargs)
+            profile["ser_depth"] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile["ser_depth"] -= 1
+                if profile["ser_depth"] == 0:
+                    profile["ser"] += time.perf_counter() - start
+        return wrapper
+
+    def _after_request(self, response):
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return response
+
+        total = time.perf_counter() - profile["start"]
+        size = None if response.is_streamed else response.calculate_content_length()
+        endpoint = request.endpoint or "<unmatched>"
+
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={profile["db"] * 1000:.2f};desc="{profile["queries"]} queries"',
+            f'ser;dur={profile["ser"] * 1000:.2f}',
+            f"total;dur={total * 1000:.2f}",
+        ])
+
+        with self._lock:
+            self._samples[endpoint].append((total, profile["db"], profile["ser"], profile["queries"], size or 0))
+
+        budget = self._config["PROFILING_QUERY_BUDGETS"].get(endpoint, self._config["PROFILING_QUERY_BUDGET"])
+        if budget is not None and profile["queries"] > budget:
+            message = f"{endpoint} ran {profile['queries']} SQL statements (budget {budget})"
+            if self._config["PROFILING_ENFORCE_BUDGET"]:
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning(message)
+
+        return response
+
+    def summary(self):
+        """
+        Per-endpoint request count and p50/p95/p99 of total time, DB time,
+        serialization time, statement count and response bytes.
+        """
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+
+        report = {}
+        for endpoint, samples in sorted(snapshot.items()):
+            columns = list(zip(*samples))
+            entry = {"requests": len(samples)}
+            for name, values, scale in (
+                ("total_ms", columns[0], 1000),
+                ("db_ms", columns[1], 1000),
+                ("serialize_ms", columns[2], 1000),
+                ("queries", columns[3], 1),
+                ("bytes", columns[4], 1),
+            ):
+                ordered = sorted(values)
+                entry[name] = {
+                    f"p{pct}": round(percentile(ordered, pct) * scale, 3) for pct in (50, 95, 99)
+                }
+                entry[name]["max"] = round(ordered[-1] * scale, 3)
+            report[endpoint] = entry
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+profiler = RequestProfiler()
@@ -1,13 +1,32 @@
 from flask import Flask, jsonify
-from extensions import db, migrate
+from extensions import db, migrate, cache
 from config import Config
+from serialization import init_json
+from instrumentation import init_pool, init_sqlite, profiler
+from auth import auth
+from ratelimit import limiter
+from passwords import hasher
+from compression import compressor
+from storage import storage
+from thumbnails import processor
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    init_json(app)
 
+    init_pool(app)
     db.init_app(app)
+    init_sqlite(app)
     migrate.init_app(app, db)
+    cache.init_app(app)
+    limiter.init_app(app)
+    auth.init_app(app)
+    hasher.init_app(app)
+    storage.init_app(app)
+    processor.init_app(app)
+    profiler.init_app(app)
+    compressor.init_app(app)
 
     from models import User, Trip, UserTrip, Entry, Photo 
 
@@ -16,11 +35,26 @@ def create_app():
     from routes.trips_routes import bp as trips_bp
     from routes.entries_routes import bp as entries_bp
     from routes.photos_routes import bp as photos_bp
+    from routes.sync_routes import bp as sync_bp
 
     app.register_blueprint(users_bp)
     app.register_blueprint(trips_bp)
     app.register_blueprint(entries_bp)
     app.register_blueprint(photos_bp)
+    app.register_blueprint(sync_bp)
+
+    if app.config["INTERNAL_ENDPOINTS"]:
+        from routes.internal_routes import bp as internal_bp
+        app.register_blueprint(internal_bp)
+
+    from stats import stats_cli
+    app.cli.add_command(stats_cli)
+    from thumbnails import photos_cli
+    app.cli.add_command(photos_cli)
+    from geo import geo_cli
+    app.cli.add_command(geo_cli)
+    from changelog import sync_cli
+    app.cli.add_command(sync_cli)
 
     @app.route("/")
     def index():
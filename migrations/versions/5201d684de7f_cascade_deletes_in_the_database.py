@@ -0,0 +1,108 @@
+"""cascade deletes in the database
+
+Revision ID: 5201d684de7f
+Revises: bc9e24857dfe
+Create Date: 2026-10-18 16:58:13.204771
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5201d684de7f'
+down_revision = 'bc9e24857dfe'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table) of every foreign key that gains ON DELETE CASCADE.
+FOREIGN_KEYS = (
+    ("entries", "trip_id", "trips"),
+    ("photos", "entry_id", "entries"),
+    ("user_trips", "user_id", "users"),
+    ("user_trips", "trip_id", "trips"),
+)
+
+# SQLite reflects the original constraints without a name; batch mode names
+# them with this convention so they can be dropped.
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# Frozen copy of the SQLite search triggers (see a6d2f8b31c57). Rebuilding
+# entries drops the triggers on it, and SQLite will not rename the rebuilt
+# table while trips_fts_au refers to entries, so all of them are dropped
+# first and created again afterwards.
+SQLITE_DROP_TRIGGERS = (
+    "DROP TRIGGER IF EXISTS trips_fts_au",
+    "DROP TRIGGER IF EXISTS entries_fts_au",
+    "DROP TRIGGER IF EXISTS entries_fts_ad",
+    "DROP TRIGGER IF EXISTS entries_fts_ai",
+)
+SQLITE_CREATE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN
+        INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+        SELECT new.id, new.title, new.content, trips.location, new.trip_id
+        FROM trips WHERE trips.id = new.trip_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF title, content, trip_id ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+        INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+        SELECT new.id, new.title, new.content, trips.location, new.trip_id
+        FROM trips WHERE trips.id = new.trip_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trips_fts_au AFTER UPDATE OF location ON trips
+    WHEN old.location IS NOT new.location BEGIN
+        UPDATE entries_fts SET location = new.location
+        WHERE rowid IN (SELECT id FROM entries WHERE trip_id = new.id);
+    END
+    """,
+)
+
+
+def constraint_name(table, column, referred, dialect, original):
+    # The original constraints were unnamed: PostgreSQL called them
+    # <table>_<column>_fkey, SQLite gets the batch naming convention.
+    if original and dialect == "postgresql":
+        return f"{table}_{column}_fkey"
+    return f"fk_{table}_{column}_{referred}"
+
+
+def replace_foreign_keys(from_original, ondelete):
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DROP_TRIGGERS:
+            op.execute(statement)
+
+    for table in dict.fromkeys(table for table, _, _ in FOREIGN_KEYS):
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for fk_table, column, referred in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                batch_op.drop_constraint(
+                    constraint_name(table, column, referred, dialect, original=from_original), type_='foreignkey'
+                )
+                batch_op.create_foreign_key(
+                    constraint_name(table, column, referred, dialect, original=not from_original),
+                    referred, [column], ['id'], ondelete=ondelete,
+                )
+
+    if dialect == "sqlite":
+        for statement in SQLITE_CREATE_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    replace_foreign_keys(from_original=True, ondelete='CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(from_original=False, ondelete=None)
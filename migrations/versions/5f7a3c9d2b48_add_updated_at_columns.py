@@ -0,0 +1,35 @@
+"""add updated_at columns for ETag validators
+
+Revision ID: 5f7a3c9d2b48
+Revises: 8c4d2a6e1f90
+Create Date: 2026-10-18 12:05:19.804116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f7a3c9d2b48'
+down_revision = '8c4d2a6e1f90'
+branch_labels = None
+depends_on = None
+
+TABLES = ('users', 'trips', 'entries', 'photos')
+
+
+def upgrade():
+    # Added as nullable, backfilled, then made NOT NULL: SQLite cannot add a
+    # NOT NULL column with a non-constant default in place.
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,134 @@
+"""add full-text search index for entries
+
+Revision ID: a6d2f8b31c57
+Revises: 5f7a3c9d2b48
+Create Date: 2026-10-18 13:02:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2f8b31c57'
+down_revision = '5f7a3c9d2b48'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of the DDL in search.py at the time of this revision.
+SQLITE_UPGRADE = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+        title, content, location, trip_id,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN
+        INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+        SELECT new.id, new.title, new.content, trips.location, new.trip_id
+        FROM trips WHERE trips.id = new.trip_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF title, content, trip_id ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+        INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+        SELECT new.id, new.title, new.content, trips.location, new.trip_id
+        FROM trips WHERE trips.id = new.trip_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trips_fts_au AFTER UPDATE OF location ON trips
+    WHEN old.location IS NOT new.location BEGIN
+        UPDATE entries_fts SET location = new.location
+        WHERE rowid IN (SELECT id FROM entries WHERE trip_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+    SELECT entries.id, entries.title, entries.content, trips.location, entries.trip_id
+    FROM entries JOIN trips ON trips.id = entries.trip_id
+    """,
+)
+SQLITE_DOWNGRADE = (
+    "DROP TRIGGER IF EXISTS trips_fts_au",
+    "DROP TRIGGER IF EXISTS entries_fts_au",
+    "DROP TRIGGER IF EXISTS entries_fts_ad",
+    "DROP TRIGGER IF EXISTS entries_fts_ai",
+    "DROP TABLE IF EXISTS entries_fts",
+)
+
+POSTGRES_UPGRADE = (
+    "ALTER TABLE entries ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION entries_search_document(title text, content text, location text)
+    RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(location, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION entries_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := entries_search_document(
+            NEW.title, NEW.content, (SELECT location FROM trips WHERE id = NEW.trip_id));
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER entries_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content, trip_id ON entries
+    FOR EACH ROW EXECUTE FUNCTION entries_search_vector_update()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION trips_search_location_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE entries SET search_vector = entries_search_document(title, content, NEW.location)
+        WHERE trip_id = NEW.id;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER trips_search_location_trigger
+    AFTER UPDATE OF location ON trips
+    FOR EACH ROW WHEN (OLD.location IS DISTINCT FROM NEW.location)
+    EXECUTE FUNCTION trips_search_location_update()
+    """,
+    """
+    UPDATE entries SET search_vector = entries_search_document(entries.title, entries.content, trips.location)
+    FROM trips WHERE trips.id = entries.trip_id
+    """,
+    # Built after the backfill: one sorted build is much faster than
+    # maintaining the index row by row.
+    "CREATE INDEX ix_entries_search_vector ON entries USING gin (search_vector)",
+)
+POSTGRES_DOWNGRADE = (
+    "DROP TRIGGER IF EXISTS trips_search_location_trigger ON trips",
+    "DROP TRIGGER IF EXISTS entries_search_vector_trigger ON entries",
+    "DROP FUNCTION IF EXISTS trips_search_location_update()",
+    "DROP FUNCTION IF EXISTS entries_search_vector_update()",
+    "DROP FUNCTION IF EXISTS entries_search_document(text, text, text)",
+    "DROP INDEX IF EXISTS ix_entries_search_vector",
+    "ALTER TABLE entries DROP COLUMN IF EXISTS search_vector",
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for statement in {"sqlite": SQLITE_UPGRADE, "postgresql": POSTGRES_UPGRADE}.get(dialect, ()):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for statement in {"sqlite": SQLITE_DOWNGRADE, "postgresql": POSTGRES_DOWNGRADE}.get(dialect, ()):
+        op.execute(statement)
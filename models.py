@@ -1,58 +1,143 @@
-from datetime import date
+from datetime import date, datetime, timezone
 from extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hasher
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RowSerializer:
+    """
+    Read-only list endpoints select `json_fields` as plain Row tuples instead
+    of ORM entities; row_to_dict turns such a Row into the same dict as to_dict().
+
+    Both take an optional subset of json_fields (the ?fields= parameter), so a
+    response only selects and sends the columns the client asked for.
+    """
+    json_fields = ()
+
+    @classmethod
+    def json_columns(cls, fields=None, keys=()):
+        """
+        Columns for `fields` (default all json_fields), followed by any of the
+        sort `keys` columns a keyset page needs that were not asked for.
+        """
+        names = fields or cls.json_fields
+        return [getattr(cls, name) for name in names] + [c for c in keys if c.key not in names]
+
+    @classmethod
+    def _date_fields(cls):
+        if "_date_field_names" not in cls.__dict__:
+            cls._date_field_names = tuple(
+                name for name in cls.json_fields
+                if isinstance(cls.__table__.c[name].type, (db.Date, db.DateTime))
+            )
+        return cls._date_field_names
+
+    @classmethod
+    def _isoformat_dates(cls, data):
+        for name in cls._date_fields():
+            if data.get(name) is not None:
+                data[name] = data[name].isoformat()
+        return data
+
+    @classmethod
+    def row_to_dict(cls, row, fields=None):
+        """
+        Columns the row was selected with that are not json_fields (counts,
+        scores) are always kept; of the json_fields, only `fields` if given.
+        """
+        data = row._asdict()
+        if fields:
+            data = {name: value for name, value in data.items() if name in fields or name not in cls.json_fields}
+        return cls._isoformat_dates(data)
+
+    def to_dict(self, fields=None):
+        # Reads only the requested attributes, so it is safe on an object
+        # loaded with load_only(*json_columns(fields)).
+        return self._isoformat_dates({name: getattr(self, name) for name in fields or self.json_fields})
 
 
 # ----------------------------
 # Users
 # ----------------------------
-class User(db.Model):
+class User(RowSerializer, db.Model):
     __tablename__ = "users"
+    json_fields = ("id", "username", "email")
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
 
-    trips = db.relationship("UserTrip", back_populates="user", cascade="all, delete-orphan")
+    # passive_deletes: children are removed by ON DELETE CASCADE in the
+    # database instead of being loaded and deleted one by one.
+    trips = db.relationship("UserTrip", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "username": self.username,
-            "email": self.email,
-        }
+        return hasher.verify(self.password_hash, password)
 
 
 # ----------------------------
 # Trips
 # ----------------------------
-class Trip(db.Model):
+class Trip(RowSerializer, db.Model):
     __tablename__ = "trips"
+    json_fields = ("id", "title", "start_date", "end_date", "location", "latitude", "longitude")
+    __table_args__ = (
+        db.Index("ix_trips_geohash", "geohash"),
+        db.Index("ix_trips_start_date", "start_date"),
+        db.Index("ix_trips_end_date", "end_date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     location = db.Column(db.String(120), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
 
-    users = db.relationship("UserTrip", back_populates="trip", cascade="all, delete-orphan")
-    entries = db.relationship("Entry", back_populates="trip", cascade="all, delete-orphan")
+    # Given by the client or geocoded from `location` (see geo.py); geohash
+    # is derived from them and indexed for nearby queries.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "start_date": self.start_date.isoformat(),
-            "end_date": self.end_date.isoformat(),
-            "location": self.location,
-        }
+    users = db.relationship("UserTrip", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
+    entries = db.relationship("Entry", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
+    stats = db.relationship(
+        "TripStats", back_populates="trip", uselist=False, cascade="all, delete-orphan", passive_deletes=True
+    )
+
+
+# ----------------------------
+# Trip stats (summary)
+# ----------------------------
+class TripStats(RowSerializer, db.Model):
+    """
+    Denormalized totals for one trip, maintained by stats.py from every
+    handler that changes entries, photos or travellers.
+    """
+    __tablename__ = "trip_stats"
+    json_fields = (
+        "trip_id", "entry_count", "photo_count", "traveller_count",
+        "entry_days", "first_entry_date", "last_entry_date",
+    )
+
+    trip_id = db.Column(db.Integer, db.ForeignKey("trips.id", ondelete="CASCADE"), primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    photo_count = db.Column(db.Integer, nullable=False, default=0)
+    traveller_count = db.Column(db.Integer, nullable=False, default=0)
+    entry_days = db.Column(db.Integer, nullable=False, default=0)
+    first_entry_date = db.Column(db.Date)
+    last_entry_date = db.Column(db.Date)
+
+    trip = db.relationship("Trip", back_populates="stats")
 
 
 # ----------------------------
@@ -60,10 +145,14 @@ class Trip(db.Model):
 # ----------------------------
 class UserTrip(db.Model):
     __tablename__ = "user_trips"
+    __table_args__ = (
+        db.Index("ix_user_trips_user_id_trip_id", "user_id", "trip_id"),
+        db.Index("ix_user_trips_trip_id_user_id", "trip_id", "user_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    trip_id = db.Column(db.Integer, db.ForeignKey("trips.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    trip_id = db.Column(db.Integer, db.ForeignKey("trips.id", ondelete="CASCADE"), nullable=False)
 
     user = db.relationship("User", back_populates="trips")
     trip = db.relationship("Trip", back_populates="users")
@@ -79,45 +168,92 @@ class UserTrip(db.Model):
 # ----------------------------
 # Entries
 # ----------------------------
-class Entry(db.Model):
+class Entry(RowSerializer, db.Model):
     __tablename__ = "entries"
+    json_fields = ("id", "trip_id", "date", "title", "content")
+    __table_args__ = (
+        db.Index("ix_entries_date_id", "date", "id"),
+        db.Index("ix_entries_trip_id_date_id", "trip_id", "date", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    trip_id = db.Column(db.Integer, db.ForeignKey("trips.id"), nullable=False)
+    trip_id = db.Column(db.Integer, db.ForeignKey("trips.id", ondelete="CASCADE"), nullable=False)
     date = db.Column(db.Date, nullable=False)
     title = db.Column(db.String(120), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
 
     trip = db.relationship("Trip", back_populates="entries")
-    photos = db.relationship("Photo", back_populates="entry", cascade="all, delete-orphan")
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "trip_id": self.trip_id,
-            "date": self.date.isoformat(),
-            "title": self.title,
-            "content": self.content,
-        }
+    photos = db.relationship("Photo", back_populates="entry", cascade="all, delete-orphan", passive_deletes=True)
 
 
 # ----------------------------
 # Photos
 # ----------------------------
-class Photo(db.Model):
+class Photo(RowSerializer, db.Model):
     __tablename__ = "photos"
+    json_fields = (
+        "id", "entry_id", "url", "caption", "status", "width", "height",
+        "taken_at", "latitude", "longitude", "thumbnails",
+    )
+    __table_args__ = (
+        db.Index("ix_photos_entry_id_id", "entry_id", "id"),
+        db.Index("ix_photos_geohash", "geohash"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    entry_id = db.Column(db.Integer, db.ForeignKey("entries.id"), nullable=False)
+    entry_id = db.Column(db.Integer, db.ForeignKey("entries.id", ondelete="CASCADE"), nullable=False)
     url = db.Column(db.String(255), nullable=False)
     caption = db.Column(db.String(255))
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+    # Set for uploaded files (see storage.py and thumbnails.py); photos
+    # created from a plain url keep them empty. Uploads are "pending" until
+    # the thumbnails exist, then "ready" (or "failed").
+    storage_key = db.Column(db.String(255))
+    content_type = db.Column(db.String(50))
+    size_bytes = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False, default="ready", server_default="ready")
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    taken_at = db.Column(db.DateTime)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    thumbnails = db.Column(db.JSON)  # {"160": url, "480": url, ...}
+    geohash = db.Column(db.String(12))  # of latitude/longitude, see geo.py
 
     entry = db.relationship("Entry", back_populates="photos")
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "entry_id": self.entry_id,
-            "url": self.url,
-            "caption": self.caption,
-        }
+
+# ----------------------------
+# Change log (delta sync)
+# ----------------------------
+class Change(db.Model):
+    """
+    One row per write to a synced row, appended by changelog.py in the same
+    transaction. The id is the sync token: it only grows, and
+    sqlite_autoincrement keeps SQLite from reusing ids after compaction.
+    """
+    __tablename__ = "changes"
+    __table_args__ = (
+        db.Index("ix_changes_table_name_row_id_id", "table_name", "row_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(20), nullable=False)  # "trips", "entries" or "photos"
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # "upsert" or "delete"
+    changed_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+
+class ChangeCompaction(db.Model):
+    """
+    A `flask sync compact` run. Tombstones up to `through_id` are gone, so
+    tokens between 1 and the highest through_id can no longer be synced.
+    """
+    __tablename__ = "change_compactions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    through_id = db.Column(db.Integer, nullable=False)
+    compacted_at = db.Column(db.DateTime, nullable=False, default=utcnow)
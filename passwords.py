@@ -0,0 +1,102 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from concurrency import gevent_patched, run_cpu_bound
+
+
+class PasswordHasher:
+    """
+    Runs werkzeug's password KDF off the request thread.
+
+    "process" (default) hashes in a bounded pool of PASSWORD_HASH_WORKERS
+    processes, so a burst of logins and registrations can occupy at most that
+    many cores and never holds the GIL of a worker that is serving other
+    requests. "thread" uses a thread pool and "inline" hashes in the request.
+
+    The pool is created on first use and again after a fork, so it is safe
+    with gunicorn's preload_app. In a gevent worker, pool threads would be
+    greenlets, so "thread" and "inline" hash on gevent's native threads.
+    Hashes are produced with PASSWORD_HASH_METHOD; needs_rehash() tells
+    login when a stored hash was made with other parameters.
+    """
+
+    def __init__(self):
+        self.method = "scrypt"
+        self.kind = "inline"
+        self.workers = 1
+        self._executor = None
+        self._pid = None
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH_METHOD", "scrypt")
+        app.config.setdefault("PASSWORD_HASH_EXECUTOR", "process")
+        app.config.setdefault("PASSWORD_HASH_WORKERS", 2)
+
+        kind = app.config["PASSWORD_HASH_EXECUTOR"]
+        if kind not in ("process", "thread", "inline"):
+            raise RuntimeError(f"Unknown PASSWORD_HASH_EXECUTOR '{kind}'.")
+        self.shutdown()
+        self.kind = kind
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.workers = max(int(app.config["PASSWORD_HASH_WORKERS"]), 1)
+        self._prefix = None
+        app.extensions["password_hasher"] = self
+
+    def executor(self):
+        if self.kind == "inline" or (self.kind == "thread" and gevent_patched()):
+            return None
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    if self.kind == "process":
+                        # forkserver children start clean instead of inheriting
+                        # the threads and connections of a request worker.
+                        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+                        self._executor = ProcessPoolExecutor(
+                            self.workers, mp_context=multiprocessing.get_context(method)
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def shutdown(self):
+        # A pool inherited through fork belongs to the parent process.
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def _run(self, fn, *args):
+        executor = self.executor()
+        if executor is None:
+            return run_cpu_bound(fn, *args)
+        return executor.submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """
+        True if the hash was made with a method or cost parameters other than
+        PASSWORD_HASH_METHOD, e.g. "pbkdf2:sha256:600000" after a switch to
+        "scrypt:65536:8:1".
+        """
+        if self._prefix is None:
+            # werkzeug fills in default parameters ("scrypt" ->
+            # "scrypt:32768:8:1"), so read them off a real hash once.
+            self._prefix = self.hash("").split("$", 1)[0]
+        return password_hash.split("$", 1)[0] != self._prefix
+
+
+hasher = PasswordHasher()
+atexit.register(hasher.shutdown)
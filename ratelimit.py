@@ -0,0 +1,298 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from flask import current_app, g, request
+
+from cache import RedisBackend, redis
+from utils import error_response
+
+LIMIT_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?(?:\s+burst\s+(\d+))?\s*$")
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+# Never limited, so operators can always look at what the limiter is doing
+EXEMPT_BLUEPRINTS = {"internal"}
+
+
+class Limit:
+    """
+    A token bucket: `capacity` tokens, refilled at `rate` tokens per second.
+    Parsed from "10/minute", "100/10seconds" or "10/minute burst 30"; the
+    burst (bucket size) defaults to the count.
+    """
+
+    def __init__(self, name, spec):
+        match = LIMIT_RE.match(spec)
+        if match is None:
+            raise RuntimeError(f"Invalid rate limit '{spec}' for '{name}'.")
+        count, multiple, period, burst = match.groups()
+        self.name = name
+        self.spec = spec.strip()
+        self.rate = int(count) / (int(multiple or 1) * PERIODS[period])
+        self.capacity = int(burst or count)
+        if self.rate <= 0 or self.capacity <= 0:
+            raise RuntimeError(f"Rate limit '{spec}' for '{name}' must be positive.")
+
+
+def parse_limits(value):
+    """
+    {rule: spec} from a dict or a "rule=spec; rule=spec" string, where rule
+    is an endpoint ("users.login"), a blueprint ("entries"), either prefixed
+    with a method ("POST entries"), or "default".
+    """
+    if isinstance(value, str):
+        value = dict(part.split("=", 1) for part in value.split(";") if "=" in part)
+    limits = {}
+    for name, spec in (value or {}).items():
+        if spec and spec.strip():
+            name = " ".join(name.split())
+            limits[name] = Limit(name, spec)
+    return limits
+
+
+def take(tokens, updated, now, rate, capacity, cost=1):
+    """
+    Refill a bucket last seen at `updated` and try to take `cost` tokens.
+    Returns (allowed, tokens left, seconds until `cost` tokens are there).
+    The Redis script below is a line-for-line port of this function.
+    """
+    tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+class MemoryBuckets:
+    """
+    Buckets in this worker process. Each worker enforces the limit on its
+    own, so with N workers a client may get up to N times the rate.
+    Least recently used buckets are dropped beyond `max_keys`; a dropped
+    bucket comes back full, which is what an idle bucket would be anyway.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            allowed, tokens, retry_after = take(tokens, updated, now, rate, capacity, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBuckets:
+    """
+    Buckets on a Redis-compatible server, shared by every worker. Refill and
+    take run in one Lua script against the server clock, so concurrent
+    requests from several workers cannot both spend the last token.
+    """
+
+    SCRIPT = """
+    local rate, capacity, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = math.min(capacity, (tonumber(state[1]) or capacity)
+        + math.max(now - (tonumber(state[2]) or now), 0) * rate)
+    local allowed, retry_after = 0, 0
+    if tokens >= cost then
+        allowed, tokens = 1, tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+    return {allowed, tostring(tokens), tostring(retry_after)}
+    """
+
+    def __init__(self, client, prefix="tj:rl:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    @classmethod
+    def from_url(cls, url):
+        if redis is None:
+            raise RuntimeError("RATELIMIT_STORAGE='redis' requires the 'redis' package.")
+        return cls(redis.Redis.from_url(url))
+
+    def acquire(self, key, rate, capacity, cost=1):
+        allowed, tokens, retry_after = self._script(keys=[self.prefix + key], args=[rate, capacity, cost])
+        return bool(allowed), float(tokens), float(retry_after)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+# ----------------------------
+# Flask extension
+# ----------------------------
+class RateLimiter:
+    """
+    Per-client token buckets checked before the view runs.
+
+    RATELIMITS maps rules to limits. A request uses the most specific rule
+    that matches: "POST entries.create_entry", "entries.create_entry",
+    "POST entries", "entries", then "default". Routes sharing a blueprint
+    rule share one bucket per client. Clients are identified by the user of
+    a valid bearer token, otherwise by IP address (the RATELIMIT_PROXY_COUNT-th
+    address from the right of X-Forwarded-For behind proxies).
+
+    Over the limit the request gets 429 with Retry-After. Allowed and
+    rejected counts per rule are kept for GET /__ratelimits. If the shared
+    backend is unreachable requests are let through and counted as errors.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.backend = MemoryBuckets()
+        self.limits = {}
+        self.proxy_count = 0
+        self._rules = {}
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {"allowed": 0, "rejected": 0, "errors": 0})
+
+    def init_app(self, app):
+        app.config.setdefault("RATELIMIT_ENABLED", True)
+        app.config.setdefault("RATELIMIT_STORAGE", "memory")
+        app.config.setdefault("RATELIMIT_REDIS_URL", app.config.get("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+        app.config.setdefault("RATELIMIT_MAX_KEYS", 10000)
+        app.config.setdefault("RATELIMIT_PROXY_COUNT", 0)
+        app.config.setdefault("RATELIMITS", {})
+        app.extensions["ratelimit"] = self
+
+        self.enabled = app.config["RATELIMIT_ENABLED"]
+        self.limits = parse_limits(app.config["RATELIMITS"])
+        self.proxy_count = int(app.config["RATELIMIT_PROXY_COUNT"])
+        self._rules = {}
+        if not self.enabled or not self.limits:
+            return
+
+        storage = app.config["RATELIMIT_STORAGE"]
+        if storage == "memory":
+            self.backend = MemoryBuckets(app.config["RATELIMIT_MAX_KEYS"])
+        elif storage == "redis":
+            cache = app.extensions.get("cache")
+            if cache is not None and isinstance(cache.backend, RedisBackend):
+                self.backend = RedisBuckets(cache.backend.client)
+            else:
+                self.backend = RedisBuckets.from_url(app.config["RATELIMIT_REDIS_URL"])
+        else:
+            raise RuntimeError(f"Unknown RATELIMIT_STORAGE '{storage}'.")
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def rule_for(self, method, endpoint):
+        """
+        The Limit that applies to a method and endpoint, or None.
+        """
+        key = (method, endpoint)
+        if key not in self._rules:
+            blueprint = endpoint.rpartition(".")[0]
+            candidates = [f"{method} {endpoint}", endpoint]
+            if blueprint:
+                candidates += [f"{method} {blueprint}", blueprint]
+            candidates.append("default")
+            exempt = blueprint in EXEMPT_BLUEPRINTS or endpoint == "static"
+            self._rules[key] = None if exempt else next(
+                (self.limits[name] for name in candidates if name in self.limits), None
+            )
+        return self._rules[key]
+
+    def client_id(self):
+        user_id = g.get("user_id")
+        if user_id is None:
+            scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+            auth = current_app.extensions.get("auth")
+            if scheme.lower() == "bearer" and token and auth is not None:
+                # Verified tokens are cached, so this is usually a dict lookup.
+                claims = auth.verify(token.strip())
+                user_id = claims[0] if claims else None
+        if user_id is not None:
+            return f"user:{user_id}"
+
+        address = request.remote_addr
+        if self.proxy_count:
+            route = request.access_route
+            if len(route) >= self.proxy_count:
+                address = route[-self.proxy_count]
+        return f"ip:{address}"
+
+    def _count(self, rule, outcome):
+        with self._lock:
+            self._counters[rule.name][outcome] += 1
+
+    def _before_request(self):
+        if request.endpoint is None:
+            return None
+        rule = self.rule_for(request.method, request.endpoint)
+        if rule is None:
+            return None
+
+        try:
+            allowed, remaining, retry_after = self.backend.acquire(
+                f"{rule.name}:{self.client_id()}", rule.rate, rule.capacity
+            )
+        except Exception:
+            current_app.logger.exception("Rate limit backend failed; letting the request through")
+            self._count(rule, "errors")
+            return None
+
+        g._ratelimit = (rule, remaining)
+        if allowed:
+            self._count(rule, "allowed")
+            return None
+
+        self._count(rule, "rejected")
+        body, status = error_response(f"Rate limit exceeded ({rule.spec})", 429)
+        return body, status, {"Retry-After": str(max(math.ceil(retry_after), 1))}
+
+    def _after_request(self, response):
+        limited = g.pop("_ratelimit", None)
+        if limited is not None:
+            rule, remaining = limited
+            response.headers["X-RateLimit-Limit"] = rule.spec
+            response.headers["X-RateLimit-Remaining"] = str(int(remaining))
+        return response
+
+    def summary(self):
+        """
+        Configured rules with this worker's allowed/rejected/error counts.
+        """
+        with self._lock:
+            counters = {name: dict(counts) for name, counts in self._counters.items()}
+        return {
+            "pid": os.getpid(),
+            "enabled": self.enabled,
+            "storage": type(self.backend).__name__,
+            "rules": {
+                name: {"limit": limit.spec, **counters.get(name, {"allowed": 0, "rejected": 0, "errors": 0})}
+                for name, limit in sorted(self.limits.items())
+            },
+            "rejected_total": sum(counts["rejected"] for counts in counters.values()),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+        self.backend.clear()
+
+
+limiter = RateLimiter()
@@ -1,17 +1,108 @@
 from flask import Blueprint, request, jsonify
-from extensions import db
-from models import Entry, Trip
-from utils import error_response, validate_fields, parse_date
+from sqlalchemy import insert, update
+from sqlalchemy.orm import load_only
+from extensions import db, cache
+from models import Entry, Trip, Photo
+from utils import (
+    error_response, validate_fields, parse_date, parse_int_arg, parse_date_window,
+    paginate, wants_ndjson, ndjson_response,
+    read_bulk_items, bulk_error, as_id, existing_ids,
+    make_etag, not_modified, with_etag, page_etag, parse_limit, parse_fields,
+)
+from search import parse_terms, decode_offset, search_entries
+from storage import storage, photo_file_keys
+import changelog
+import stats
 
 bp = Blueprint("entries", __name__, url_prefix="/entries")
 
 
+def filtered_entries(trip_id=None, start=None, end=None):
+    """
+    Entries narrowed by trip and an inclusive date window. The filters match the
+    (trip_id, date, id) and (date, id) indexes, so they never scan the table.
+    """
+    query = Entry.query
+    if trip_id is not None:
+        query = query.filter(Entry.trip_id == trip_id)
+    if start:
+        query = query.filter(Entry.date >= start)
+    if end:
+        query = query.filter(Entry.date <= end)
+    return query
+
+
+def deleted_entry_tags(entry_ids):
+    """
+    Cache tags to invalidate before deleting entries: the entries, their trips
+    and the photos that are deleted along with them.
+    """
+    trip_ids = db.session.scalars(db.select(Entry.trip_id).where(Entry.id.in_(entry_ids)).distinct())
+    photo_ids = db.session.scalars(db.select(Photo.id).where(Photo.entry_id.in_(entry_ids)))
+    return [
+        "entries", "photos",
+        *(f"entry:{i}" for i in entry_ids),
+        *(f"trip:{i}" for i in trip_ids),
+        *(f"photo:{i}" for i in photo_ids),
+    ]
+
+
+def list_entries_response(query, fields=None):
+    # Plain column tuples: no ORM identity map or instrumented attribute access.
+    # Only the requested fields are selected, plus the (date, id) sort key.
+    rows = query.with_entities(*Entry.json_columns(fields, keys=[Entry.date, Entry.id]))
+    if wants_ndjson():
+        return ndjson_response(rows.order_by(Entry.date, Entry.id), lambda row: Entry.row_to_dict(row, fields))
+
+    try:
+        etag = page_etag(query, [Entry.date, Entry.id], Entry)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        entries, next_cursor = paginate(rows, [Entry.date, Entry.id])
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    return with_etag(jsonify({
+        "entries": [Entry.row_to_dict(e, fields) for e in entries], "next_cursor": next_cursor,
+    }), etag)
+
+
 # -------------------- Entry CRUD --------------------
 
 @bp.route("/", methods=["GET"])
+@cache.cached("entries", unless=wants_ndjson)
 def list_entries():
-    entries = Entry.query.all()
-    return jsonify([e.to_dict() for e in entries]), 200
+    try:
+        trip_id = parse_int_arg("trip_id")
+        start, end = parse_date_window()
+        fields = parse_fields(Entry)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    return list_entries_response(filtered_entries(trip_id, start, end), fields)
+
+
+@bp.route("/search", methods=["GET"])
+def search():
+    # Not cached: user-scoped results also depend on trip membership, and
+    # free-text queries rarely repeat.
+    try:
+        terms = parse_terms(request.args.get("q"))
+        trip_id = parse_int_arg("trip_id")
+        user_id = parse_int_arg("user_id")
+        limit = parse_limit(request.args.get("limit"))
+        offset = decode_offset(request.args.get("after"))
+        fields = parse_fields(Entry)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    if trip_id is None and user_id is None:
+        return error_response("Parameter 'trip_id' or 'user_id' is required.", 400)
+
+    try:
+        rows, next_cursor = search_entries(terms, trip_id, user_id, limit, offset)
+    except NotImplementedError as e:
+        return error_response(str(e), 501)
+    return jsonify({"entries": [Entry.row_to_dict(row, fields) for row in rows], "next_cursor": next_cursor})
 
 
 @bp.route("/", methods=["POST"])
@@ -38,20 +129,37 @@ def create_entry():
     )
     db.session.add(entry)
     try:
+        stats.adjust({trip.id: {"entry_count": 1}})
+        stats.refresh_dates([trip.id])
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate("entries", f"trip:{entry.trip_id}")
     return jsonify({"message": "Entry created", "entry": entry.to_dict()}), 201
 
 
 @bp.route("/<int:entry_id>", methods=["GET"])
+@cache.cached("entry:{entry_id}")
 def get_entry(entry_id):
-    entry = Entry.query.get(entry_id)
+    try:
+        fields = parse_fields(Entry)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    updated_at = db.session.scalar(db.select(Entry.updated_at).where(Entry.id == entry_id))
+    if updated_at is None:
+        return error_response("Entry not found", 404)
+    etag = make_etag(updated_at)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    entry = Entry.query.options(load_only(*Entry.json_columns(fields))).get(entry_id)
     if not entry:
         return error_response("Entry not found", 404)
-    return jsonify(entry.to_dict()), 200
+    return with_etag(jsonify(entry.to_dict(fields)), etag)
 
 
 @bp.route("/<int:entry_id>", methods=["PUT"])
@@ -73,11 +181,14 @@ def update_entry(entry_id):
             return error_response(str(ve), 400)
 
     try:
+        if db.inspect(entry).attrs.date.history.has_changes():
+            stats.refresh_dates([entry.trip_id])
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate("entries", f"entry:{entry.id}", f"trip:{entry.trip_id}")
     return jsonify({"message": "Entry updated", "entry": entry.to_dict()}), 200
 
 
@@ -87,11 +198,183 @@ def delete_entry(entry_id):
     if not entry:
         return error_response("Entry not found", 404)
 
+    tags = deleted_entry_tags([entry.id])
+    counts = stats.entry_counts([entry.id])
+    files = photo_file_keys(Photo.entry_id == entry.id)
+    # Photos are deleted by ON DELETE CASCADE.
     db.session.delete(entry)
     try:
+        changelog.record("photos", db.select(Photo.id).where(Photo.entry_id == entry.id), changelog.DELETE)
+        stats.adjust(stats.negate(counts))
+        stats.refresh_dates(counts)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate(*tags)
+    storage.delete_many(files)
     return jsonify({"message": "Entry deleted"}), 200
+
+
+# -------------------- Bulk operations --------------------
+# Each bulk endpoint validates every item, checks parent/own ids with one IN
+# query, writes all valid items with a single executemany and commits once.
+# The response lists one result per input item, in input order.
+
+@bp.route("/bulk", methods=["POST"])
+def bulk_create_entries():
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    known_trips = existing_ids(Trip, (as_id(i.get("trip_id")) for i in items if isinstance(i, dict)))
+
+    results = [None] * len(items)
+    rows, positions = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = bulk_error(index, "Item must be a JSON object")
+            continue
+        valid, msg = validate_fields(item, ["trip_id", "date", "title", "content"])
+        if not valid:
+            results[index] = bulk_error(index, msg)
+            continue
+        trip_id = as_id(item["trip_id"])
+        if trip_id not in known_trips:
+            results[index] = bulk_error(index, "Trip not found", 404)
+            continue
+        try:
+            entry_date = parse_date(item["date"], "date")
+        except ValueError as ve:
+            results[index] = bulk_error(index, str(ve))
+            continue
+
+        rows.append({"trip_id": trip_id, "date": entry_date, "title": item["title"], "content": item["content"]})
+        positions.append(index)
+
+    if rows:
+        try:
+            # Batched into multi-row INSERT ... RETURNING where the driver can keep
+            # parameter order (PostgreSQL); SQLite falls back to one statement
+            # per row, still inside the same transaction.
+            entries = db.session.scalars(
+                insert(Entry).returning(Entry, sort_by_parameter_order=True), rows
+            ).all()
+            created = [entry.to_dict() for entry in entries]
+            changelog.record("entries", [data["id"] for data in created])
+            added = {}
+            for row in rows:
+                added[row["trip_id"]] = added.get(row["trip_id"], 0) + 1
+            stats.adjust({trip_id: {"entry_count": n} for trip_id, n in added.items()})
+            stats.refresh_dates(added)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return error_response(f"Database error: {e}", 500)
+
+        for index, data in zip(positions, created):
+            results[index] = {"index": index, "status": 201, "entry": data}
+        cache.invalidate("entries", *{f"trip:{row['trip_id']}" for row in rows})
+
+    return jsonify({"results": results}), 200
+
+
+@bp.route("/bulk", methods=["PUT"])
+def bulk_update_entries():
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    known = existing_ids(Entry, (as_id(i.get("id")) for i in items if isinstance(i, dict)))
+
+    results = [None] * len(items)
+    rows, positions = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = bulk_error(index, "Item must be a JSON object")
+            continue
+        entry_id = as_id(item.get("id"))
+        if entry_id not in known:
+            results[index] = bulk_error(index, "Entry not found", 404)
+            continue
+
+        row = {"id": entry_id}
+        if item.get("title"):
+            row["title"] = item["title"]
+        if item.get("content"):
+            row["content"] = item["content"]
+        if item.get("date"):
+            try:
+                row["date"] = parse_date(item["date"], "date")
+            except ValueError as ve:
+                results[index] = bulk_error(index, str(ve))
+                continue
+
+        rows.append(row)
+        positions.append(index)
+
+    if rows:
+        changed = [row for row in rows if len(row) > 1]
+        try:
+            if changed:
+                db.session.execute(update(Entry), changed)
+                changelog.record("entries", [row["id"] for row in changed])
+            redated = [row["id"] for row in changed if "date" in row]
+            if redated:
+                stats.refresh_dates(db.session.scalars(
+                    db.select(Entry.trip_id).where(Entry.id.in_(redated)).distinct()
+                ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return error_response(f"Database error: {e}", 500)
+
+        entries = {e.id: e for e in Entry.query.filter(Entry.id.in_([row["id"] for row in rows]))}
+        for index, row in zip(positions, rows):
+            results[index] = {"index": index, "status": 200, "entry": entries[row["id"]].to_dict()}
+        cache.invalidate(
+            "entries",
+            *(f"entry:{e.id}" for e in entries.values()),
+            *(f"trip:{e.trip_id}" for e in entries.values()),
+        )
+
+    return jsonify({"results": results}), 200
+
+
+@bp.route("/bulk", methods=["DELETE"])
+def bulk_delete_entries():
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    ids = [as_id(i) for i in items]
+    known = existing_ids(Entry, ids)
+
+    if known:
+        tags = deleted_entry_tags(known)
+        counts = stats.entry_counts(known)
+        files = photo_file_keys(Photo.entry_id.in_(known))
+        try:
+            changelog.record("photos", db.select(Photo.id).where(Photo.entry_id.in_(known)), changelog.DELETE)
+            changelog.record("entries", known, changelog.DELETE)
+            # Their photos go with them (ON DELETE CASCADE).
+            Entry.query.filter(Entry.id.in_(known)).delete(synchronize_session=False)
+            stats.adjust(stats.negate(counts))
+            stats.refresh_dates(counts)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return error_response(f"Database error: {e}", 500)
+        cache.invalidate(*tags)
+        storage.delete_many(files)
+
+    results = [
+        {"index": index, "id": entry_id, "status": 200} if entry_id in known
+        else bulk_error(index, "Entry not found", 404)
+        for index, entry_id in enumerate(ids)
+    ]
+    return jsonify({"results": results}), 200
@@ -0,0 +1,25 @@
+from flask import Blueprint, current_app, jsonify
+from extensions import db
+from instrumentation import pool_status
+from utils import error_response
+
+# Diagnostics for operators; only registered when INTERNAL_ENDPOINTS is on.
+bp = Blueprint("internal", __name__)
+
+
+@bp.route("/__pool", methods=["GET"])
+def pool():
+    return jsonify(pool_status(db.engine)), 200
+
+
+@bp.route("/__stats", methods=["GET"])
+def stats():
+    profiler = current_app.extensions["profiler"]
+    if not profiler.enabled:
+        return error_response("Profiling is disabled (set PROFILING_ENABLED)", 404)
+    return jsonify(profiler.summary()), 200
+
+
+@bp.route("/__ratelimits", methods=["GET"])
+def ratelimits():
+    return jsonify(current_app.extensions["ratelimit"].summary()), 200
@@ -1,17 +1,66 @@
-from flask import Blueprint, request, jsonify
-from extensions import db
+from flask import Blueprint, current_app, request, jsonify, send_from_directory
+from sqlalchemy import insert, update
+from sqlalchemy.orm import load_only
+from extensions import db, cache
 from models import Photo, Entry
-from utils import error_response, validate_fields
+from storage import storage, photo_file_keys, LocalStorage, UploadTooLarge, UnsupportedImage
+from thumbnails import processor
+from geo import located, parse_coordinates, parse_bbox, within_bbox
+import changelog
+import stats
+from utils import (
+    error_response, validate_fields, parse_int_arg, paginate, wants_ndjson, ndjson_response,
+    read_bulk_items, bulk_error, as_id, existing_ids,
+    make_etag, not_modified, with_etag, page_etag, parse_fields,
+)
 
 bp = Blueprint("photos", __name__, url_prefix="/photos")
 
 
+def photo_cache_tags(photo_ids):
+    """
+    Cache tags to invalidate when photos change: the photos, the photo list and
+    the trips whose expanded detail embeds them.
+    """
+    trip_ids = db.session.scalars(
+        db.select(Entry.trip_id).join(Photo).where(Photo.id.in_(photo_ids)).distinct()
+    )
+    return ["photos", *(f"photo:{i}" for i in photo_ids), *(f"trip:{i}" for i in trip_ids)]
+
+
 # -------------------- Photo CRUD --------------------
 
 @bp.route("/", methods=["GET"])
+@cache.cached("photos", unless=wants_ndjson)
 def list_photos():
-    photos = Photo.query.all()
-    return jsonify([p.to_dict() for p in photos]), 200
+    try:
+        entry_id = parse_int_arg("entry_id")
+        bbox = parse_bbox(request.args["bbox"]) if request.args.get("bbox") else None
+        fields = parse_fields(Photo)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    query = Photo.query
+    if entry_id is not None:
+        query = query.filter(Photo.entry_id == entry_id)
+    if bbox is not None:
+        query = query.filter(within_bbox(Photo, *bbox))
+
+    rows = query.with_entities(*Photo.json_columns(fields, keys=[Photo.id]))
+    if wants_ndjson():
+        return ndjson_response(rows.order_by(Photo.id), lambda row: Photo.row_to_dict(row, fields))
+
+    try:
+        etag = page_etag(query, [Photo.id], Photo)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        photos, next_cursor = paginate(rows, [Photo.id])
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    return with_etag(jsonify({
+        "photos": [Photo.row_to_dict(p, fields) for p in photos], "next_cursor": next_cursor,
+    }), etag)
 
 
 @bp.route("/", methods=["POST"])
@@ -21,27 +70,109 @@ def create_photo():
     if not valid:
         return error_response(msg, 400)
 
+    try:
+        point = parse_coordinates(data)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
     entry = Entry.query.get(data["entry_id"])
     if not entry:
         return error_response("Entry not found", 404)
 
-    photo = Photo(entry_id=entry.id, url=data["url"], caption=data.get("caption"))
+    photo = Photo(entry_id=entry.id, url=data["url"], caption=data.get("caption"), **located(point))
     db.session.add(photo)
     try:
+        stats.adjust({entry.trip_id: {"photo_count": 1}})
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate("photos", f"trip:{entry.trip_id}")
     return jsonify({"message": "Photo created", "photo": photo.to_dict()}), 201
 
 
+@bp.route("/upload", methods=["POST"])
+def upload_photo():
+    """
+    Store an image sent as the raw request body (?entry_id=&caption=) or as
+    the "file" field of a multipart form, then process it in the background.
+    """
+    try:
+        entry_id = parse_int_arg("entry_id")
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("file")
+        if upload is None:
+            return error_response("Missing multipart field 'file'", 400)
+        stream, form = upload.stream, request.form
+    else:
+        stream, form = request.stream, request.args
+    entry_id = entry_id if entry_id is not None else as_id(form.get("entry_id"))
+    if entry_id is None:
+        return error_response("Missing required fields: entry_id", 400)
+
+    entry = Entry.query.get(entry_id)
+    if not entry:
+        return error_response("Entry not found", 404)
+
+    try:
+        key, content_type, size = storage.save_upload(stream, entry.id)
+    except UploadTooLarge as e:
+        return error_response(str(e), 413)
+    except UnsupportedImage as e:
+        return error_response(str(e), 415)
+
+    photo = Photo(
+        entry_id=entry.id, url=storage.url(key), caption=form.get("caption"), storage_key=key,
+        content_type=content_type, size_bytes=size, status="pending",
+    )
+    db.session.add(photo)
+    try:
+        stats.adjust({entry.trip_id: {"photo_count": 1}})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        storage.delete_many([key])
+        return error_response(f"Database error: {e}", 500)
+
+    cache.invalidate("photos", f"trip:{entry.trip_id}")
+    processor.submit(photo.id)
+    return jsonify({"message": "Photo uploaded", "photo": photo.to_dict()}), 202
+
+
+@bp.route("/files/<path:key>", methods=["GET"])
+def photo_file(key):
+    # Keys are random and never reused, so files can be cached forever.
+    if not isinstance(storage.backend, LocalStorage):
+        return error_response("File not found", 404)
+    return send_from_directory(
+        storage.backend.root, key, max_age=current_app.config["PHOTO_FILE_MAX_AGE"]
+    )
+
+
 @bp.route("/<int:photo_id>", methods=["GET"])
+@cache.cached("photo:{photo_id}")
 def get_photo(photo_id):
-    photo = Photo.query.get(photo_id)
+    try:
+        fields = parse_fields(Photo)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    updated_at = db.session.scalar(db.select(Photo.updated_at).where(Photo.id == photo_id))
+    if updated_at is None:
+        return error_response("Photo not found", 404)
+    etag = make_etag(updated_at)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    photo = Photo.query.options(load_only(*Photo.json_columns(fields))).get(photo_id)
     if not photo:
         return error_response("Photo not found", 404)
-    return jsonify(photo.to_dict()), 200
+    return with_etag(jsonify(photo.to_dict(fields)), etag)
 
 
 @bp.route("/<int:photo_id>", methods=["PUT"])
@@ -55,6 +186,14 @@ def update_photo(photo_id):
         photo.url = data["url"]
     if "caption" in data:
         photo.caption = data["caption"]
+    if "latitude" in data or "longitude" in data:
+        # Both null clears the location.
+        try:
+            point = parse_coordinates(data)
+        except ValueError as ve:
+            return error_response(str(ve), 400)
+        for name, value in located(point).items():
+            setattr(photo, name, value)
 
     try:
         db.session.commit()
@@ -62,6 +201,7 @@ def update_photo(photo_id):
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate(*photo_cache_tags([photo.id]))
     return jsonify({"message": "Photo updated", "photo": photo.to_dict()}), 200
 
 
@@ -71,11 +211,163 @@ def delete_photo(photo_id):
     if not photo:
         return error_response("Photo not found", 404)
 
+    tags = photo_cache_tags([photo.id])
+    counts = stats.photo_counts([photo.id])
+    files = photo_file_keys(Photo.id == photo.id)
     db.session.delete(photo)
     try:
+        stats.adjust(stats.negate(counts))
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate(*tags)
+    storage.delete_many(files)
     return jsonify({"message": "Photo deleted"}), 200
+
+
+# -------------------- Bulk operations --------------------
+# Same contract as the entries bulk endpoints: one IN query for ids, one
+# executemany, one commit, one result per input item.
+
+@bp.route("/bulk", methods=["POST"])
+def bulk_create_photos():
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    known_entries = existing_ids(Entry, (as_id(i.get("entry_id")) for i in items if isinstance(i, dict)))
+
+    results = [None] * len(items)
+    rows, positions = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = bulk_error(index, "Item must be a JSON object")
+            continue
+        valid, msg = validate_fields(item, ["entry_id", "url"])
+        if not valid:
+            results[index] = bulk_error(index, msg)
+            continue
+        entry_id = as_id(item["entry_id"])
+        if entry_id not in known_entries:
+            results[index] = bulk_error(index, "Entry not found", 404)
+            continue
+        try:
+            point = parse_coordinates(item)
+        except ValueError as ve:
+            results[index] = bulk_error(index, str(ve))
+            continue
+
+        rows.append({"entry_id": entry_id, "url": item["url"], "caption": item.get("caption"), **located(point)})
+        positions.append(index)
+
+    if rows:
+        try:
+            # Batched into multi-row INSERT ... RETURNING where the driver can keep
+            # parameter order (PostgreSQL); SQLite falls back to one statement
+            # per row, still inside the same transaction.
+            photos = db.session.scalars(
+                insert(Photo).returning(Photo, sort_by_parameter_order=True), rows
+            ).all()
+            created = [photo.to_dict() for photo in photos]
+            changelog.record("photos", [data["id"] for data in created])
+            stats.adjust(stats.photo_counts([data["id"] for data in created]))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return error_response(f"Database error: {e}", 500)
+
+        for index, data in zip(positions, created):
+            results[index] = {"index": index, "status": 201, "photo": data}
+        cache.invalidate(*photo_cache_tags([data["id"] for data in created]))
+
+    return jsonify({"results": results}), 200
+
+
+@bp.route("/bulk", methods=["PUT"])
+def bulk_update_photos():
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    known = existing_ids(Photo, (as_id(i.get("id")) for i in items if isinstance(i, dict)))
+
+    results = [None] * len(items)
+    rows, positions = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = bulk_error(index, "Item must be a JSON object")
+            continue
+        photo_id = as_id(item.get("id"))
+        if photo_id not in known:
+            results[index] = bulk_error(index, "Photo not found", 404)
+            continue
+
+        row = {"id": photo_id}
+        if item.get("url"):
+            row["url"] = item["url"]
+        if "caption" in item:
+            row["caption"] = item["caption"]
+        if "latitude" in item or "longitude" in item:
+            try:
+                row.update(located(parse_coordinates(item)))
+            except ValueError as ve:
+                results[index] = bulk_error(index, str(ve))
+                continue
+
+        rows.append(row)
+        positions.append(index)
+
+    if rows:
+        changed = [row for row in rows if len(row) > 1]
+        try:
+            if changed:
+                db.session.execute(update(Photo), changed)
+                changelog.record("photos", [row["id"] for row in changed])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return error_response(f"Database error: {e}", 500)
+
+        photos = {p.id: p for p in Photo.query.filter(Photo.id.in_([row["id"] for row in rows]))}
+        for index, row in zip(positions, rows):
+            results[index] = {"index": index, "status": 200, "photo": photos[row["id"]].to_dict()}
+        cache.invalidate(*photo_cache_tags(list(photos)))
+
+    return jsonify({"results": results}), 200
+
+
+@bp.route("/bulk", methods=["DELETE"])
+def bulk_delete_photos():
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    ids = [as_id(i) for i in items]
+    known = existing_ids(Photo, ids)
+
+    if known:
+        tags = photo_cache_tags(known)
+        counts = stats.photo_counts(known)
+        files = photo_file_keys(Photo.id.in_(known))
+        try:
+            changelog.record("photos", known, changelog.DELETE)
+            Photo.query.filter(Photo.id.in_(known)).delete(synchronize_session=False)
+            stats.adjust(stats.negate(counts))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return error_response(f"Database error: {e}", 500)
+        cache.invalidate(*tags)
+        storage.delete_many(files)
+
+    results = [
+        {"index": index, "id": photo_id, "status": 200} if photo_id in known
+        else bulk_error(index, "Photo not found", 404)
+        for index, photo_id in enumerate(ids)
+    ]
+    return jsonify({"results": results}), 200
@@ -0,0 +1,35 @@
+from flask import Blueprint, current_app, jsonify
+import changelog
+from utils import error_response, parse_int_arg
+
+bp = Blueprint("sync", __name__, url_prefix="/sync")
+
+
+# ----------------------------
+# Delta sync
+# ----------------------------
+@bp.route("/", methods=["GET"], strict_slashes=False)
+def sync():
+    """
+    Trips, entries and photos created, updated or deleted after ?since=<token>,
+    oldest changes first. Pass the returned next_since back until has_more is
+    false. since=0 (or none) starts from the beginning of the log, which holds
+    every row that existed when it was created.
+    """
+    try:
+        since = parse_int_arg("since") or 0
+        limit = parse_int_arg("limit")
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    max_limit = current_app.config["SYNC_PAGE_SIZE"]
+    limit = max_limit if limit is None else limit
+    if since < 0 or not 1 <= limit <= max_limit:
+        return error_response(f"Parameter 'since' must be >= 0 and 'limit' between 1 and {max_limit}.", 400)
+
+    # A client that synced before the latest compaction may have missed
+    # deletions whose tombstones are gone; it has to download everything.
+    if 0 < since < changelog.horizon():
+        return error_response("Change token has expired; sync again from since=0.", 410)
+
+    return jsonify(changelog.changes_since(since, limit)), 200
@@ -1,18 +1,63 @@
-from flask import Blueprint, request, jsonify
-from extensions import db
-from models import Trip, User, UserTrip
-from utils import error_response, validate_fields, parse_date
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload, load_only
+from extensions import db, cache
+from models import Trip, TripStats, User, UserTrip, Entry, Photo
+from utils import (
+    error_response, validate_fields, parse_date, parse_date_window, parse_float_arg,
+    paginate, wants_ndjson, ndjson_response,
+    make_etag, not_modified, with_etag, page_etag, parse_fields,
+)
+from routes.entries_routes import filtered_entries, list_entries_response
+from storage import storage, photo_file_keys
+from geo import geocoded, located, parse_coordinates, radius_bbox, within_bbox, haversine_km
+import changelog
+import stats
 
 bp = Blueprint("trips", __name__, url_prefix="/trips")
 
+EXPANDABLE = ("entries", "photos", "users")
+
 
 # ----------------------------
 # CRUD for trips
 # ----------------------------
 @bp.route("/", methods=["GET"])
+@cache.cached("trips", unless=wants_ndjson)
 def list_trips():
-    trips = Trip.query.all()
-    return jsonify([t.to_dict() for t in trips]), 200
+    try:
+        fields = parse_fields(Trip)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    query = Trip.query
+    if request.args.get("overlaps"):
+        # Trips with at least one day inside the window: each bound is a
+        # range predicate on its own indexed date column.
+        try:
+            start, end = parse_date(request.args["overlaps"], "overlaps", allow_range=True)
+        except ValueError as ve:
+            return error_response(str(ve), 400)
+        if start is not None:
+            query = query.filter(Trip.end_date >= start)
+        if end is not None:
+            query = query.filter(Trip.start_date <= end)
+
+    rows = query.with_entities(*Trip.json_columns(fields, keys=[Trip.id]))
+    if wants_ndjson():
+        return ndjson_response(rows.order_by(Trip.id), lambda row: Trip.row_to_dict(row, fields))
+
+    try:
+        etag = page_etag(query, [Trip.id], Trip)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        trips, next_cursor = paginate(rows, [Trip.id])
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    return with_etag(jsonify({
+        "trips": [Trip.row_to_dict(t, fields) for t in trips], "next_cursor": next_cursor,
+    }), etag)
 
 
 @bp.route("/", methods=["POST"])
@@ -25,17 +70,21 @@ def create_trip():
     try:
         start = parse_date(data["start_date"], "start_date")
         end = parse_date(data["end_date"], "end_date")
+        point = parse_coordinates(data)
     except ValueError as ve:
         return error_response(str(ve), 400)
 
     if end < start:
         return error_response("end_date cannot be earlier than start_date", 400)
 
+    # Explicit coordinates win; otherwise look the location up offline.
     trip = Trip(
         title=data["title"],
         start_date=start,
         end_date=end,
-        location=data["location"]
+        location=data["location"],
+        stats=TripStats(),
+        **(located(point) if point else geocoded(data["location"])),
     )
     db.session.add(trip)
     try:
@@ -44,15 +93,142 @@ def create_trip():
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate("trips")
     return jsonify({"message": "Trip created", "trip": trip.to_dict()}), 201
 
 
+@bp.route("/nearby", methods=["GET"])
+@cache.cached("trips")
+def nearby_trips():
+    """
+    Trips within ?radius= km (great-circle) of ?lat=&lon=, nearest first.
+    The geohash index narrows the search to the cells around the circle's
+    bounding box; exact distances are computed for that candidate set only.
+    """
+    config = current_app.config
+    try:
+        lat, lon, radius = parse_float_arg("lat"), parse_float_arg("lon"), parse_float_arg("radius")
+        fields = parse_fields(Trip)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    if lat is None or lon is None:
+        return error_response("Parameters 'lat' and 'lon' are required.", 400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return error_response("Parameter 'lat' must be within [-90, 90] and 'lon' within [-180, 180].", 400)
+    radius = config["NEARBY_DEFAULT_RADIUS_KM"] if radius is None else radius
+    if not 0 < radius <= config["NEARBY_MAX_RADIUS_KM"]:
+        return error_response(f"Parameter 'radius' must be between 0 and {config['NEARBY_MAX_RADIUS_KM']:g} km.", 400)
+
+    columns = Trip.json_columns(fields, keys=[Trip.id, Trip.latitude, Trip.longitude])
+    rows = Trip.query.with_entities(*columns).filter(within_bbox(Trip, *radius_bbox(lat, lon, radius)))
+    found = []
+    for row in rows:
+        distance = haversine_km(lat, lon, row.latitude, row.longitude)
+        if distance <= radius:
+            found.append((distance, row))
+    found.sort(key=lambda item: (item[0], item[1].id))
+    found = found[:config["NEARBY_MAX_RESULTS"]]
+
+    # The rows are already read, so the tag covers every value in the body
+    # and only the serialization is saved.
+    etag = make_etag(radius, *(tuple(row) for _, row in found))
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    trips = []
+    for distance, row in found:
+        trip = Trip.row_to_dict(row, fields)
+        trip["distance_km"] = round(distance, 3)
+        trips.append(trip)
+    return with_etag(jsonify({"trips": trips, "radius_km": radius}), etag)
+
+
 @bp.route("/<int:trip_id>", methods=["GET"])
+@cache.cached("trip:{trip_id}")
 def get_trip(trip_id):
-    trip = Trip.query.get(trip_id)
+    expand = {e.strip() for e in request.args.get("expand", "").split(",") if e.strip()}
+    unknown = expand.difference(EXPANDABLE)
+    if unknown:
+        return error_response(f"Cannot expand: {', '.join(sorted(unknown))}", 400)
+    try:
+        fields = parse_fields(Trip)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    # Photos are nested under their entries, so expanding photos implies entries.
+    if "photos" in expand:
+        expand.add("entries")
+
+    validators = trip_validators(trip_id, expand)
+    if validators is None:
+        return error_response("Trip not found", 404)
+    etag = make_etag(*validators)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    # One SELECT per expanded level instead of one per child row. ?fields=
+    # narrows the trip itself; expanded children are always complete.
+    options = [load_only(*Trip.json_columns(fields))]
+    if "entries" in expand:
+        entries_loader = selectinload(Trip.entries)
+        if "photos" in expand:
+            entries_loader = entries_loader.selectinload(Entry.photos)
+        options.append(entries_loader)
+    if "users" in expand:
+        options.append(selectinload(Trip.users).joinedload(UserTrip.user))
+
+    trip = Trip.query.options(*options).filter_by(id=trip_id).first()
     if not trip:
         return error_response("Trip not found", 404)
-    return jsonify(trip.to_dict()), 200
+    return with_etag(jsonify(trip_tree(trip, expand, fields)), etag)
+
+
+def trip_validators(trip_id, expand):
+    """
+    Version of a trip and of each expanded child collection. Entries and
+    photos are read with aggregate queries: count catches inserts/deletes,
+    max(updated_at) catches edits. Travellers are few, so their link rows
+    are read whole. Returns None if the trip does not exist.
+    """
+    updated_at = db.session.scalar(db.select(Trip.updated_at).where(Trip.id == trip_id))
+    if updated_at is None:
+        return None
+
+    validators = [updated_at]
+    if "entries" in expand:
+        validators.append(tuple(db.session.execute(
+            db.select(func.count(Entry.id), func.max(Entry.updated_at)).where(Entry.trip_id == trip_id)
+        ).one()))
+    if "photos" in expand:
+        validators.append(tuple(db.session.execute(
+            db.select(func.count(Photo.id), func.max(Photo.updated_at))
+            .join(Entry).where(Entry.trip_id == trip_id)
+        ).one()))
+    if "users" in expand:
+        # The links themselves, not an aggregate: user_trips ids are reused
+        # after a delete, so count and max(id) can stay the same when a
+        # traveller is swapped for another.
+        validators.append(tuple(db.session.execute(
+            db.select(UserTrip.id, UserTrip.user_id, User.updated_at)
+            .join(User).where(UserTrip.trip_id == trip_id).order_by(UserTrip.id)
+        ).all()))
+    return validators
+
+
+def trip_tree(trip, expand, fields=None):
+    data = trip.to_dict(fields)
+    if "entries" in expand:
+        data["entries"] = []
+        for entry in sorted(trip.entries, key=lambda e: (e.date, e.id)):
+            item = entry.to_dict()
+            if "photos" in expand:
+                item["photos"] = [p.to_dict() for p in sorted(entry.photos, key=lambda p: p.id)]
+            data["entries"].append(item)
+    if "users" in expand:
+        data["users"] = [link.user.to_dict() for link in sorted(trip.users, key=lambda l: l.user_id)]
+    return data
 
 
 @bp.route("/<int:trip_id>", methods=["PUT"])
@@ -64,8 +240,17 @@ def update_trip(trip_id):
     data = request.get_json() or {}
     if "title" in data and data["title"]:
         trip.title = data["title"]
-    if "location" in data and data["location"]:
+    coordinates = None
+    if "location" in data and data["location"] and data["location"] != trip.location:
         trip.location = data["location"]
+        coordinates = geocoded(trip.location)
+    if "latitude" in data or "longitude" in data:
+        try:
+            coordinates = located(parse_coordinates(data))
+        except ValueError as ve:
+            return error_response(str(ve), 400)
+    for name, value in (coordinates or {}).items():
+        setattr(trip, name, value)
     if "start_date" in data and data["start_date"]:
         try:
             trip.start_date = parse_date(data["start_date"], "start_date")
@@ -86,6 +271,7 @@ def update_trip(trip_id):
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate("trips", f"trip:{trip.id}")
     return jsonify({"message": "Trip updated", "trip": trip.to_dict()}), 200
 
 
@@ -95,32 +281,94 @@ def delete_trip(trip_id):
     if not trip:
         return error_response("Trip not found", 404)
 
-    # Delete associated UserTrip links automatically
-    UserTrip.query.filter_by(trip_id=trip.id).delete()
-
+    # Cached entries and photos of the trip disappear with it
+    tags = ["trips", f"trip:{trip.id}", "entries", "photos"]
+    tags += [f"entry:{i}" for i in db.session.scalars(db.select(Entry.id).where(Entry.trip_id == trip.id))]
+    tags += [f"photo:{i}" for i in db.session.scalars(
+        db.select(Photo.id).join(Entry).where(Entry.trip_id == trip.id)
+    )]
+    trip_entries = db.select(Entry.id).where(Entry.trip_id == trip.id)
+    files = photo_file_keys(Photo.entry_id.in_(trip_entries))
+
+    # Travellers, entries, photos and stats go with the trip through ON
+    # DELETE CASCADE, without being loaded; only the change log needs ids.
     db.session.delete(trip)
     try:
+        changelog.record("photos", db.select(Photo.id).where(Photo.entry_id.in_(trip_entries)), changelog.DELETE)
+        changelog.record("entries", trip_entries, changelog.DELETE)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate(*tags)
+    storage.delete_many(files)
     return jsonify({"message": "Trip deleted"}), 200
 
 
+@bp.route("/<int:trip_id>/stats", methods=["GET"])
+@cache.cached("trip:{trip_id}")
+def get_trip_stats(trip_id):
+    try:
+        fields = parse_fields(TripStats)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    data = stats.trip_stats(trip_id, fields)
+    if data is None:
+        return error_response("Trip not found", 404)
+    # One primary-key read of trip_stats, which is its own validator.
+    etag = make_etag(data)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    return with_etag(jsonify(data), etag)
+
+
+# ----------------------------
+# Entries of a trip
+# ----------------------------
+@bp.route("/<int:trip_id>/entries", methods=["GET"])
+@cache.cached("trip:{trip_id}", unless=wants_ndjson)
+def list_trip_entries(trip_id):
+    if not db.session.query(Trip.query.filter_by(id=trip_id).exists()).scalar():
+        return error_response("Trip not found", 404)
+
+    try:
+        start, end = parse_date_window()
+        fields = parse_fields(Entry)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    return list_entries_response(filtered_entries(trip_id, start, end), fields)
+
+
 # ----------------------------
 # Manage users on a trip
 # ----------------------------
 @bp.route("/<int:trip_id>/users", methods=["GET"])
+@cache.cached("trip:{trip_id}")
 def list_trip_users(trip_id):
+    try:
+        fields = parse_fields(User)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
     trip = Trip.query.get(trip_id)
     if not trip:
         return error_response("Trip not found", 404)
 
-    links = UserTrip.query.filter_by(trip_id=trip.id).all()
-    user_ids = [l.user_id for l in links]
-    users = User.query.filter(User.id.in_(user_ids)).all()
-    return jsonify([u.to_dict() for u in users]), 200
+    etag = make_etag(*db.session.execute(
+        db.select(UserTrip.id, User.updated_at).join(User).where(UserTrip.trip_id == trip.id).order_by(UserTrip.id)
+    ).all())
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    users = (
+        User.query.options(load_only(*User.json_columns(fields)))
+        .join(UserTrip).filter(UserTrip.trip_id == trip.id).order_by(User.id).all()
+    )
+    return with_etag(jsonify([u.to_dict(fields) for u in users]), etag)
 
 
 @bp.route("/<int:trip_id>/users", methods=["POST"])
@@ -145,11 +393,13 @@ def add_user_to_trip(trip_id):
     link = UserTrip(user_id=user.id, trip_id=trip.id)
     db.session.add(link)
     try:
+        stats.adjust({trip.id: {"traveller_count": 1}})
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate(f"trip:{trip.id}", f"user:{user.id}")
     return jsonify({
         "message": "User added to trip",
         "link": link.to_dict()
@@ -164,9 +414,11 @@ def remove_user_from_trip(trip_id, user_id):
 
     db.session.delete(link)
     try:
+        stats.adjust({trip_id: {"traveller_count": -1}})
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate(f"trip:{trip_id}", f"user:{user_id}")
     return jsonify({"message": "User removed from trip"}), 200
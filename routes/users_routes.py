@@ -1,15 +1,42 @@
-from flask import Blueprint, request, jsonify
-from extensions import db
-from models import User
-from utils import error_response, validate_fields
+from flask import Blueprint, current_app, g, request, jsonify
+from sqlalchemy import func
+from sqlalchemy.orm import load_only
+from extensions import db, cache
+from auth import login_required
+from passwords import hasher
+import stats
+from models import User, UserTrip, Trip, TripStats
+from utils import (
+    error_response, validate_fields, paginate, wants_ndjson, ndjson_response,
+    make_etag, not_modified, with_etag, page_etag, parse_date_window, parse_fields,
+)
 
 bp = Blueprint("users", __name__, url_prefix="/users")
 
 
 @bp.route("/", methods=["GET"])
+@cache.cached("users", unless=wants_ndjson)
 def list_users():
-    users = User.query.all()
-    return jsonify([u.to_dict() for u in users]), 200
+    try:
+        fields = parse_fields(User)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    rows = User.query.with_entities(*User.json_columns(fields, keys=[User.id]))
+    if wants_ndjson():
+        return ndjson_response(rows.order_by(User.id), lambda row: User.row_to_dict(row, fields))
+
+    try:
+        etag = page_etag(User.query, [User.id], User)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        users, next_cursor = paginate(rows, [User.id])
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    return with_etag(jsonify({
+        "users": [User.row_to_dict(u, fields) for u in users], "next_cursor": next_cursor,
+    }), etag)
 
 
 @bp.route("/register", methods=["POST"])
@@ -33,6 +60,7 @@ def register():
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate("users")
     return jsonify({"message": "User registered", "user": user.to_dict()}), 201
 
 
@@ -47,7 +75,45 @@ def login():
     if not user or not user.check_password(data["password"]):
         return error_response("Invalid username or password", 401)
 
-    return jsonify({"message": f"Welcome, {user.username}!", "user": user.to_dict()}), 200
+    # Upgrade hashes made with older PASSWORD_HASH_METHOD parameters while
+    # the plaintext is at hand. A failure here must not fail the login.
+    if hasher.needs_rehash(user.password_hash):
+        user.set_password(data["password"])
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    auth = current_app.extensions["auth"]
+    return jsonify({
+        "message": f"Welcome, {user.username}!",
+        "user": user.to_dict(),
+        "access_token": auth.issue(user.id),
+        "token_type": "Bearer",
+        "expires_in": auth.max_age,
+    }), 200
+
+
+@bp.route("/logout", methods=["POST"])
+@login_required
+def logout():
+    current_app.extensions["auth"].revoke(g.token_id, g.token_expires_at)
+    return jsonify({"message": "Logged out"}), 200
+
+
+@bp.route("/me", methods=["GET"])
+@login_required
+def me():
+    try:
+        fields = parse_fields(User)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    user = db.session.get(User, g.user_id, options=[load_only(*User.json_columns(fields))])
+    if not user:
+        return error_response("User not found", 404)
+    return jsonify({"user": user.to_dict(fields)}), 200
+
 
 @bp.route("/<int:user_id>", methods=["DELETE"])
 def delete_user(user_id):
@@ -55,11 +121,104 @@ def delete_user(user_id):
     if not user:
         return error_response("User not found", 404)
 
+    # The user also disappears from the traveller lists of their trips
+    trip_ids = db.session.scalars(db.select(UserTrip.trip_id).where(UserTrip.user_id == user.id)).all()
+    tags = ["users", f"user:{user.id}", *(f"trip:{i}" for i in set(trip_ids))]
+    travellers = {}
+    for trip_id in trip_ids:
+        travellers[trip_id] = travellers.get(trip_id, 0) - 1
     db.session.delete(user)
     try:
+        stats.adjust({trip_id: {"traveller_count": n} for trip_id, n in travellers.items()})
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return error_response(f"Database error: {e}", 500)
 
+    cache.invalidate(*tags)
     return jsonify({"message": "User deleted"}), 200
+
+
+# ----------------------------
+# A user's trips
+# ----------------------------
+def trip_summary(row, fields=None):
+    data = Trip.row_to_dict(row, fields)
+    if data["last_entry_date"] is not None:
+        data["last_entry_date"] = data["last_entry_date"].isoformat()
+    return data
+
+
+@bp.route("/<int:user_id>/trips", methods=["GET"])
+@cache.cached("trips", "entries", "photos", "user:{user_id}")
+def list_user_trips(user_id):
+    if not db.session.query(User.query.filter_by(id=user_id).exists()).scalar():
+        return error_response("User not found", 404)
+    try:
+        fields = parse_fields(Trip)
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+
+    # Counts come from trip_stats, so a page costs one indexed join no
+    # matter how many entries and photos the trips have.
+    counts = (
+        func.coalesce(TripStats.entry_count, 0).label("entry_count"),
+        func.coalesce(TripStats.photo_count, 0).label("photo_count"),
+        TripStats.last_entry_date,
+    )
+    rows = (
+        db.session.query(*Trip.json_columns(fields, keys=[Trip.id]), *counts)
+        .filter(Trip.id.in_(db.select(UserTrip.trip_id).where(UserTrip.user_id == user_id)))
+        .outerjoin(TripStats, TripStats.trip_id == Trip.id)
+    )
+    try:
+        etag = page_etag(rows, [Trip.id], Trip, *counts)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        trips, next_cursor = paginate(rows, [Trip.id])
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    return with_etag(jsonify({"trips": [trip_summary(t, fields) for t in trips], "next_cursor": next_cursor}), etag)
+
+
+@bp.route("/<int:user_id>/stats", methods=["GET"])
+@cache.cached("trips", "entries", "photos", "user:{user_id}")
+def get_user_stats(user_id):
+    if not db.session.query(User.query.filter_by(id=user_id).exists()).scalar():
+        return error_response("User not found", 404)
+    # The totals are one indexed read of trip_stats, so they are their own
+    # validator.
+    data = stats.user_stats(user_id)
+    etag = make_etag(data)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    return with_etag(jsonify(data), etag)
+
+
+@bp.route("/<int:user_id>/calendar", methods=["GET"])
+@cache.cached("entries", "user:{user_id}")
+def get_user_calendar(user_id):
+    if not db.session.query(User.query.filter_by(id=user_id).exists()).scalar():
+        return error_response("User not found", 404)
+
+    granularity = request.args.get("granularity", "month")
+    if granularity not in stats.CALENDAR_FORMATS:
+        return error_response(
+            f"Parameter 'granularity' must be one of: {', '.join(stats.CALENDAR_FORMATS)}.", 400
+        )
+    try:
+        start, end = parse_date_window()
+    except ValueError as ve:
+        return error_response(str(ve), 400)
+    periods = stats.calendar(user_id, granularity, start, end)
+    etag = make_etag(periods)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    return with_etag(jsonify({
+        "user_id": user_id,
+        "granularity": granularity,
+        "periods": periods,
+    }), etag)
@@ -0,0 +1,240 @@
+import re
+
+from sqlalchemy import event, text
+
+from extensions import db
+from models import Entry, UserTrip
+from utils import encode_cursor, decode_cursor
+
+MAX_RESULTS = 1000
+SNIPPET_OPEN, SNIPPET_CLOSE = "<mark>", "</mark>"
+
+TERM_RE = re.compile(r"(\w+)(\*?)")
+OFFSET_COLUMN = db.column("offset", db.Integer)
+
+
+# ----------------------------
+# Index DDL
+# ----------------------------
+# The index lives outside the models: an FTS5 table on SQLite, a tsvector
+# column with a GIN index on PostgreSQL. Triggers keep it in sync with
+# entries (title, content, trip_id) and trips (location), so every write
+# path, including bulk and raw SQL ones, is covered. Every statement is
+# idempotent; the migration carries its own copy.
+SQLITE_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+        title, content, location, trip_id,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN
+        INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+        SELECT new.id, new.title, new.content, trips.location, new.trip_id
+        FROM trips WHERE trips.id = new.trip_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF title, content, trip_id ON entries BEGIN
+        DELETE FROM entries_fts WHERE rowid = old.id;
+        INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+        SELECT new.id, new.title, new.content, trips.location, new.trip_id
+        FROM trips WHERE trips.id = new.trip_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trips_fts_au AFTER UPDATE OF location ON trips
+    WHEN old.location IS NOT new.location BEGIN
+        UPDATE entries_fts SET location = new.location
+        WHERE rowid IN (SELECT id FROM entries WHERE trip_id = new.id);
+    END
+    """,
+)
+SQLITE_BACKFILL = """
+    INSERT INTO entries_fts (rowid, title, content, location, trip_id)
+    SELECT entries.id, entries.title, entries.content, trips.location, entries.trip_id
+    FROM entries JOIN trips ON trips.id = entries.trip_id
+"""
+
+POSTGRES_DDL = (
+    "ALTER TABLE entries ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION entries_search_document(title text, content text, location text)
+    RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(location, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION entries_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := entries_search_document(
+            NEW.title, NEW.content, (SELECT location FROM trips WHERE id = NEW.trip_id));
+        RETURN NEW;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS entries_search_vector_trigger ON entries",
+    """
+    CREATE TRIGGER entries_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content, trip_id ON entries
+    FOR EACH ROW EXECUTE FUNCTION entries_search_vector_update()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION trips_search_location_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE entries SET search_vector = entries_search_document(title, content, NEW.location)
+        WHERE trip_id = NEW.id;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS trips_search_location_trigger ON trips",
+    """
+    CREATE TRIGGER trips_search_location_trigger
+    AFTER UPDATE OF location ON trips
+    FOR EACH ROW WHEN (OLD.location IS DISTINCT FROM NEW.location)
+    EXECUTE FUNCTION trips_search_location_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_entries_search_vector ON entries USING gin (search_vector)",
+)
+POSTGRES_BACKFILL = """
+    UPDATE entries SET search_vector = entries_search_document(entries.title, entries.content, trips.location)
+    FROM trips WHERE trips.id = entries.trip_id AND entries.search_vector IS NULL
+"""
+
+
+def search_index_exists(connection):
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        found = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries_fts'"
+    elif dialect == "postgresql":
+        found = ("SELECT 1 FROM information_schema.columns "
+                 "WHERE table_name = 'entries' AND column_name = 'search_vector'")
+    else:
+        return False
+    return connection.execute(text(found)).first() is not None
+
+
+@event.listens_for(db.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    """
+    Install the index when tables come from db.create_all() rather than
+    migrations, indexing any entries that already exist.
+    """
+    statements = {"sqlite": (SQLITE_DDL, SQLITE_BACKFILL), "postgresql": (POSTGRES_DDL, POSTGRES_BACKFILL)}
+    if connection.dialect.name not in statements:
+        return
+    ddl, backfill = statements[connection.dialect.name]
+    existed = search_index_exists(connection)
+    for statement in ddl:
+        connection.execute(text(statement))
+    if not existed:
+        connection.execute(text(backfill))
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+def parse_terms(value):
+    """
+    Split ?q= into (word, is_prefix) terms. Only word characters survive, so
+    user input can never inject FTS5 or tsquery operators; a trailing "*"
+    makes a term a prefix match.
+    """
+    terms = TERM_RE.findall(value or "")
+    if not terms:
+        raise ValueError("Parameter 'q' must contain at least one word.")
+    return [(word, bool(star)) for word, star in terms]
+
+
+def decode_offset(token):
+    if not token:
+        return 0
+    (offset,) = decode_cursor(token, [OFFSET_COLUMN])
+    if not 0 <= offset < MAX_RESULTS:
+        raise ValueError("Parameter 'after' is not a valid cursor.")
+    return offset
+
+
+def _sqlite_query(terms, trip_ids):
+    words = " ".join(f'"{word}"' + ("*" if prefix else "") for word, prefix in terms)
+    scope = " OR ".join(f'"{trip_id}"' for trip_id in trip_ids)
+    match = f"{{title content location}} : ({words}) AND trip_id : ({scope})"
+    # bm25() is lower-is-better; weights favour title, then location, then content.
+    statement = text("""
+        SELECT entries.id, entries.trip_id, entries.date, entries.title, entries.content,
+               -bm25(entries_fts, 10.0, 1.0, 4.0, 0.0) AS score,
+               snippet(entries_fts, 1, :open, :close, '…', 16) AS snippet
+        FROM entries_fts JOIN entries ON entries.id = entries_fts.rowid
+        WHERE entries_fts MATCH :match
+        ORDER BY score DESC, entries.id
+        LIMIT :limit OFFSET :offset
+    """)
+    return statement, {"match": match}
+
+
+def _postgres_query(terms, trip_id, user_id):
+    query = " & ".join(word + (":*" if prefix else "") for word, prefix in terms)
+    scope = []
+    if trip_id is not None:
+        scope.append("entries.trip_id = :trip_id")
+    if user_id is not None:
+        scope.append("entries.trip_id IN (SELECT trip_id FROM user_trips WHERE user_id = :user_id)")
+    # ts_headline is the expensive part, so it only runs on the rows of the page.
+    statement = text(f"""
+        SELECT page.id, page.trip_id, page.date, page.title, page.content, page.score,
+               ts_headline('english', page.content, page.query,
+               'StartSel=' || :open || ', StopSel=' || :close || ', MaxFragments=1, MaxWords=24, MinWords=8')
+               AS snippet
+        FROM (
+            SELECT entries.id, entries.trip_id, entries.date, entries.title, entries.content,
+                   ts_rank_cd(entries.search_vector, q.query) AS score, q.query
+            FROM entries, to_tsquery('english', :query) AS q(query)
+            WHERE entries.search_vector @@ q.query AND {" AND ".join(scope)}
+            ORDER BY score DESC, entries.id
+            LIMIT :limit OFFSET :offset
+        ) AS page
+        ORDER BY page.score DESC, page.id
+    """)
+    return statement, {"query": query, "trip_id": trip_id, "user_id": user_id}
+
+
+def search_entries(terms, trip_id=None, user_id=None, limit=50, offset=0):
+    """
+    Ranked entries matching every term within one trip and/or the trips of
+    one user. Returns (rows, next_cursor); each row has the entry columns
+    plus `score` (higher is better) and `snippet`.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        trip_ids = [trip_id] if trip_id is not None else []
+        if user_id is not None:
+            user_trips = set(db.session.scalars(db.select(UserTrip.trip_id).where(UserTrip.user_id == user_id)))
+            trip_ids = [t for t in trip_ids if t in user_trips] if trip_id is not None else sorted(user_trips)
+        if not trip_ids:
+            return [], None
+        statement, params = _sqlite_query(terms, trip_ids)
+    elif dialect == "postgresql":
+        statement, params = _postgres_query(terms, trip_id, user_id)
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}.")
+
+    limit = min(limit, MAX_RESULTS - offset)
+    statement = statement.columns(*Entry.json_columns(), score=db.Float, snippet=db.Text)
+    params.update(open=SNIPPET_OPEN, close=SNIPPET_CLOSE, limit=limit + 1, offset=offset)
+    rows = db.session.execute(statement, params).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit < MAX_RESULTS:
+            next_cursor = encode_cursor([offset + limit])
+    return rows, next_cursor
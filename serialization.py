@@ -0,0 +1,143 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency, the stdlib provider is used instead
+    orjson = None
+
+
+# json.dumps escapes non-ASCII text (ensure_ascii) and writes floats outside
+# [1e-4, 1e16) with an exponent: "1e-07", "1e-05", "1e+16". orjson writes
+# UTF-8 and "1e-7", "0.00001", "1e16". With every digit mapped to 0, all of
+# its exponents contain b"0e".
+DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+NUMBER_CHARS = frozenset(b"0123456789.")
+TOKEN_STARTS = frozenset(b":,[ \n")
+# Past this many candidates, checking each one costs more than re-encoding.
+MAX_FLOAT_CANDIDATES = 256
+
+
+def _number_start(body, end):
+    """
+    Start of the run of number characters ending before `end`, or -1 when
+    the run does not begin a JSON value (it is part of a string).
+    """
+    start = end
+    while start > 0 and body[start - 1] in NUMBER_CHARS:
+        start -= 1
+    if start > 0 and body[start - 1] == ord("-"):
+        start -= 1
+    return start if start == 0 or body[start - 1] in TOKEN_STARTS else -1
+
+
+def differs_from_stdlib(body, ensure_ascii=True):
+    """
+    True when json.dumps would write this orjson output differently. Costs a
+    few linear byte scans, a fraction of the stdlib encoding it avoids.
+    """
+    if ensure_ascii and (not body.isascii() or b"\x7f" in body):
+        return True
+    budget = MAX_FLOAT_CANDIDATES
+    digits = body.translate(DIGITS_TO_ZERO)
+    at = digits.find(b"0e")
+    while at != -1:
+        # "<digits>e-<digits>" or "<digits>e<digits>" outside a string
+        if digits[at + 2:at + 3] in (b"-", b"0") and _number_start(body, at + 1) != -1:
+            return True
+        budget -= 1
+        if budget == 0:
+            return True
+        at = digits.find(b"0e", at + 2)
+    at = body.find(b"0.0000")
+    while at != -1:
+        # "0.0000..." or "-0.0000..." as a whole value, not "10.00001"
+        if _number_start(body, at) in (at, at - 1):
+            return True
+        budget -= 1
+        if budget == 0:
+            return True
+        at = body.find(b"0.0000", at + 1)
+    return False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson.
+
+    Output matches the default provider byte for byte: keys are sorted,
+    responses are indented in debug mode, and date/datetime, Decimal and
+    other non-native values go through the same `default` hook. Bodies that
+    orjson writes differently (non-ASCII text, floats with an exponent) or
+    cannot write (integers beyond 64 bits) are encoded by the stdlib
+    provider instead, as are dumps() calls whose arguments orjson cannot
+    reproduce. NaN and infinity are written as null.
+    """
+
+    base_option = (
+        (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+    )
+
+    dumps_kwargs = frozenset(("default", "indent", "separators", "sort_keys", "ensure_ascii"))
+
+    def _option(self, indent=False, sort_keys=None):
+        option = self.base_option
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _encode(self, obj, default, indent, sort_keys=None, ensure_ascii=None):
+        try:
+            body = orjson.dumps(obj, default=default, option=self._option(indent, sort_keys))
+        except orjson.JSONEncodeError:
+            return None
+        ensure_ascii = self.ensure_ascii if ensure_ascii is None else ensure_ascii
+        return None if differs_from_stdlib(body, ensure_ascii) else body
+
+    def _orjson_writes(self, kwargs):
+        """
+        True when orjson writes what json.dumps(**kwargs) would: compact
+        separators without indent, or indent=2 with the default separators.
+        json.dumps without either uses ", " and ": ", which orjson cannot.
+        """
+        if not self.dumps_kwargs.issuperset(kwargs):
+            return False
+        indent, separators = kwargs.get("indent"), kwargs.get("separators")
+        if indent is None:
+            return separators is not None and tuple(separators) == (",", ":")
+        return indent == 2 and (separators is None or tuple(separators) == (",", ": "))
+
+    def dumps(self, obj, **kwargs):
+        body = None
+        if self._orjson_writes(kwargs):
+            body = self._encode(
+                obj, kwargs.get("default", self.default), kwargs.get("indent"),
+                kwargs.get("sort_keys"), kwargs.get("ensure_ascii"),
+            )
+        if body is None:
+            return super().dumps(obj, **kwargs)
+        return body.decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = self._encode(obj, self.default, indent)
+        if body is None:
+            return super().response(obj)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def init_json(app):
+    """
+    Install the fastest available JSON provider. JSON_PROVIDER="default"
+    keeps Flask's stdlib provider even when orjson is installed.
+    """
+    choice = app.config.get("JSON_PROVIDER", "auto")
+    if choice == "orjson" and orjson is None:
+        raise RuntimeError("JSON_PROVIDER='orjson' requires the 'orjson' package.")
+    if choice in ("auto", "orjson") and orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,275 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, delete, distinct, func, insert, select
+
+from extensions import db
+from models import Trip, TripStats, UserTrip, Entry, Photo
+
+REBUILD_BATCH_SIZE = 5000
+
+
+# ----------------------------
+# Incremental maintenance
+# ----------------------------
+# Handlers call these inside their own transaction, before commit, so the
+# totals change atomically with the rows they count. Counts move by deltas
+# (UPDATE ... SET n = n + :delta, no read-modify-write); the date-derived
+# fields are recomputed for the touched trips from the (trip_id, date, id)
+# index, which costs a few index probes per trip.
+def adjust(deltas):
+    """
+    Apply count deltas: {trip_id: {"entry_count": 1, "photo_count": -3, ...}}.
+    """
+    params = [
+        {
+            "b_trip_id": trip_id,
+            "b_entries": delta.get("entry_count", 0),
+            "b_photos": delta.get("photo_count", 0),
+            "b_travellers": delta.get("traveller_count", 0),
+        }
+        for trip_id, delta in deltas.items()
+        if any(delta.values())
+    ]
+    if not params:
+        return
+    table = TripStats.__table__
+    db.session.flush()
+    db.session.execute(
+        table.update()
+        .where(table.c.trip_id == bindparam("b_trip_id"))
+        .values(
+            entry_count=table.c.entry_count + bindparam("b_entries"),
+            photo_count=table.c.photo_count + bindparam("b_photos"),
+            traveller_count=table.c.traveller_count + bindparam("b_travellers"),
+        ),
+        params,
+    )
+
+
+def refresh_dates(trip_ids):
+    """
+    Recompute entry_days and the first/last entry date of the given trips.
+    """
+    trip_ids = sorted(set(trip_ids))
+    if not trip_ids:
+        return
+    table = TripStats.__table__
+    of_trip = Entry.trip_id == table.c.trip_id
+    db.session.flush()
+    db.session.execute(
+        table.update()
+        .where(table.c.trip_id.in_(trip_ids))
+        .values(
+            entry_days=select(func.count(distinct(Entry.date))).where(of_trip).scalar_subquery(),
+            first_entry_date=select(func.min(Entry.date)).where(of_trip).scalar_subquery(),
+            last_entry_date=select(func.max(Entry.date)).where(of_trip).scalar_subquery(),
+        )
+    )
+
+
+def entry_counts(entry_ids):
+    """
+    {trip_id: {"entry_count": n, "photo_count": m}} for the given entries and
+    their photos. Read before deleting them to build negative deltas.
+    """
+    counts = {}
+    for trip_id, entries in db.session.execute(
+        select(Entry.trip_id, func.count(Entry.id)).where(Entry.id.in_(entry_ids)).group_by(Entry.trip_id)
+    ):
+        counts[trip_id] = {"entry_count": entries, "photo_count": 0}
+    for trip_id, photos in db.session.execute(
+        select(Entry.trip_id, func.count(Photo.id)).join(Photo, Photo.entry_id == Entry.id)
+        .where(Entry.id.in_(entry_ids)).group_by(Entry.trip_id)
+    ):
+        counts[trip_id]["photo_count"] = photos
+    return counts
+
+
+def photo_counts(photo_ids):
+    """
+    {trip_id: {"photo_count": n}} for the given photos.
+    """
+    return {
+        trip_id: {"photo_count": photos}
+        for trip_id, photos in db.session.execute(
+            select(Entry.trip_id, func.count(Photo.id)).join(Photo, Photo.entry_id == Entry.id)
+            .where(Photo.id.in_(photo_ids)).group_by(Entry.trip_id)
+        )
+    }
+
+
+def negate(counts):
+    return {trip_id: {k: -v for k, v in delta.items()} for trip_id, delta in counts.items()}
+
+
+# ----------------------------
+# Full recomputation
+# ----------------------------
+def aggregate(trip_ids=None):
+    """
+    SELECT computing every TripStats column from the base tables, for all
+    trips or the given ones. Used by rebuild() and as a fallback for trips
+    that have no stats row yet.
+    """
+    def scoped(query, column):
+        return query if trip_ids is None else query.where(column.in_(trip_ids))
+
+    entries = scoped(
+        select(
+            Entry.trip_id,
+            func.count(Entry.id).label("entries"),
+            func.count(distinct(Entry.date)).label("days"),
+            func.min(Entry.date).label("first"),
+            func.max(Entry.date).label("last"),
+        ), Entry.trip_id,
+    ).group_by(Entry.trip_id).subquery()
+    photos = scoped(
+        select(Entry.trip_id, func.count(Photo.id).label("photos")).join(Photo, Photo.entry_id == Entry.id),
+        Entry.trip_id,
+    ).group_by(Entry.trip_id).subquery()
+    travellers = scoped(
+        select(UserTrip.trip_id, func.count(UserTrip.id).label("travellers")), UserTrip.trip_id,
+    ).group_by(UserTrip.trip_id).subquery()
+
+    return scoped(
+        select(
+            Trip.id.label("trip_id"),
+            func.coalesce(entries.c.entries, 0).label("entry_count"),
+            func.coalesce(photos.c.photos, 0).label("photo_count"),
+            func.coalesce(travellers.c.travellers, 0).label("traveller_count"),
+            func.coalesce(entries.c.days, 0).label("entry_days"),
+            entries.c.first.label("first_entry_date"),
+            entries.c.last.label("last_entry_date"),
+        )
+        .outerjoin(entries, entries.c.trip_id == Trip.id)
+        .outerjoin(photos, photos.c.trip_id == Trip.id)
+        .outerjoin(travellers, travellers.c.trip_id == Trip.id),
+        Trip.id,
+    )
+
+
+def rebuild(trip_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute trip_stats from scratch, for all trips in batches of trip ids
+    (one transaction each) or for the given trips. Returns the rows written.
+    """
+    if trip_ids is not None:
+        batches = [sorted(set(trip_ids))]
+    else:
+        db.session.execute(delete(TripStats).where(~TripStats.trip_id.in_(select(Trip.id))))
+        db.session.commit()
+        batches = chunked_trip_ids(batch_size)
+
+    written = 0
+    for ids in batches:
+        db.session.execute(delete(TripStats).where(TripStats.trip_id.in_(ids)))
+        result = db.session.execute(insert(TripStats).from_select(list(TripStats.json_fields), aggregate(ids)))
+        db.session.commit()
+        written += result.rowcount
+    return written
+
+
+def chunked_trip_ids(batch_size):
+    last = 0
+    while True:
+        ids = db.session.scalars(select(Trip.id).where(Trip.id > last).order_by(Trip.id).limit(batch_size)).all()
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+# ----------------------------
+# Reads
+# ----------------------------
+def trip_stats(trip_id, fields=None):
+    """
+    Stats dict for one trip (only `fields` if given), or None if the trip
+    does not exist.
+    """
+    row = db.session.execute(
+        select(*TripStats.json_columns(fields)).where(TripStats.trip_id == trip_id)
+    ).first()
+    if row is None:
+        row = db.session.execute(aggregate([trip_id])).first()
+    return None if row is None else TripStats.row_to_dict(row, fields)
+
+
+def user_stats(user_id):
+    """
+    Totals over the trips a user travels on: one indexed join of
+    user_trips and trip_stats.
+    """
+    row = db.session.execute(
+        select(
+            func.count(UserTrip.trip_id).label("trip_count"),
+            func.coalesce(func.sum(TripStats.entry_count), 0).label("entry_count"),
+            func.coalesce(func.sum(TripStats.photo_count), 0).label("photo_count"),
+            func.coalesce(func.sum(TripStats.entry_days), 0).label("entry_days"),
+            func.min(TripStats.first_entry_date).label("first_entry_date"),
+            func.max(TripStats.last_entry_date).label("last_entry_date"),
+        )
+        .select_from(UserTrip)
+        .outerjoin(TripStats, TripStats.trip_id == UserTrip.trip_id)
+        .where(UserTrip.user_id == user_id)
+    ).one()
+    data = row._asdict()
+    for name in ("first_entry_date", "last_entry_date"):
+        if data[name] is not None:
+            data[name] = data[name].isoformat()
+    return {"user_id": user_id, **data}
+
+
+CALENDAR_FORMATS = {
+    # granularity: (SQLite strftime, PostgreSQL to_char)
+    "day": ("%Y-%m-%d", "YYYY-MM-DD"),
+    "month": ("%Y-%m", "YYYY-MM"),
+    "year": ("%Y", "YYYY"),
+}
+
+
+def calendar_period(column, granularity):
+    sqlite_format, pg_format = CALENDAR_FORMATS[granularity]
+    if db.session.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, pg_format)
+    return func.strftime(sqlite_format, column)
+
+
+def calendar(user_id, granularity="month", start=None, end=None):
+    """
+    Entries per day, month or year across a user's trips, oldest first:
+    [{"period": "2024-05", "entry_count": 12, "trip_count": 2}, ...]. Only
+    periods with entries are listed. One GROUP BY over the entries of the
+    user's trips, read through the (trip_id, date) index.
+    """
+    period = calendar_period(Entry.date, granularity).label("period")
+    query = (
+        select(
+            period,
+            func.count(Entry.id).label("entry_count"),
+            func.count(distinct(Entry.trip_id)).label("trip_count"),
+        )
+        .where(Entry.trip_id.in_(select(UserTrip.trip_id).where(UserTrip.user_id == user_id)))
+        .group_by(period)
+        .order_by(period)
+    )
+    if start is not None:
+        query = query.where(Entry.date >= start)
+    if end is not None:
+        query = query.where(Entry.date <= end)
+    return [row._asdict() for row in db.session.execute(query)]
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+stats_cli = AppGroup("stats", help="Maintain the trip_stats summary table.")
+
+
+@stats_cli.command("rebuild")
+@click.option("--trip-id", "trip_ids", type=int, multiple=True, help="Only rebuild these trips (repeatable).")
+@click.option("--batch-size", type=int, default=REBUILD_BATCH_SIZE, show_default=True)
+def rebuild_command(trip_ids, batch_size):
+    """Recompute trip_stats from entries, photos and user_trips."""
+    written = rebuild(list(trip_ids) or None, batch_size)
+    click.echo(f"Rebuilt stats for {written} trips.")
@@ -0,0 +1,245 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+from flask import current_app
+from werkzeug.security import safe_join
+
+from extensions import db
+from models import Photo
+
+try:
+    import boto3
+except ImportError:  # optional dependency, only needed for PHOTO_STORAGE="s3"
+    boto3 = None
+
+CHUNK_SIZE = 64 * 1024
+
+# (magic bytes at offset 0, content type, file extension); the upload's own
+# Content-Type is not trusted.
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"GIF87a", "image/gif", "gif"),
+    (b"GIF89a", "image/gif", "gif"),
+)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+def sniff_image(head):
+    """
+    (content_type, extension) for the first bytes of an image file.
+    """
+    for signature, content_type, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    raise UnsupportedImage("Only JPEG, PNG, GIF and WebP images can be uploaded.")
+
+
+class LimitedReader:
+    """
+    File-like view of a stream that replays `head` first and raises
+    UploadTooLarge once more than `max_bytes` have been read, so oversized
+    uploads are cut off while they stream in.
+    """
+
+    def __init__(self, stream, max_bytes, head=b""):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.head = head
+        self.count = 0
+
+    def read(self, size=-1):
+        if self.head:
+            cut = len(self.head) if size is None or size < 0 else size
+            data, self.head = self.head[:cut], self.head[cut:]
+        else:
+            data = self.stream.read(size)
+        self.count += len(data)
+        if self.max_bytes and self.count > self.max_bytes:
+            raise UploadTooLarge(f"Uploads are limited to {self.max_bytes} bytes.")
+        return data
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+class LocalStorage:
+    """
+    Files under a directory on this host, served by GET /photos/files/<key>.
+    Only usable with one host (or a shared volume); also what tests use.
+    """
+
+    def __init__(self, root, base_url="/photos/files"):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, key):
+        path = safe_join(self.root, key)
+        if path is None:
+            raise ValueError(f"Invalid storage key '{key}'.")
+        return path
+
+    def save(self, key, stream, content_type=None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so a failed upload never leaves a
+        # partial file behind the final key.
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(partial, "wb") as fh:
+                shutil.copyfileobj(stream, fh, CHUNK_SIZE)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key):
+        return f"{self.base_url}/{key}"
+
+
+class S3Storage:
+    """
+    Objects in an S3 (or S3-compatible) bucket. Uploads go through boto3's
+    managed multipart transfer, which reads the stream in parts instead of
+    loading the whole file.
+    """
+
+    def __init__(self, bucket, prefix="", base_url=None, endpoint_url=None):
+        if boto3 is None:
+            raise RuntimeError("PHOTO_STORAGE='s3' requires the 'boto3' package.")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.base_url = (base_url or f"https://{bucket}.s3.amazonaws.com").rstrip("/")
+
+    def save(self, key, stream, content_type=None):
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(stream, self.bucket, self.prefix + key, ExtraArgs=extra)
+
+    def open(self, key):
+        # Image decoders need to seek, so the object is spooled to a temp file.
+        spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        self.client.download_fileobj(self.bucket, self.prefix + key, spooled)
+        spooled.seek(0)
+        return spooled
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def url(self, key):
+        return f"{self.base_url}/{self.prefix}{key}"
+
+
+# ----------------------------
+# Flask extension
+# ----------------------------
+class PhotoStorage:
+    """
+    Where uploaded originals and thumbnails live: PHOTO_STORAGE="local"
+    (PHOTO_STORAGE_PATH) or "s3" (PHOTO_S3_BUCKET).
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.max_bytes = None
+
+    def init_app(self, app):
+        app.config.setdefault("PHOTO_STORAGE", "local")
+        app.config.setdefault("PHOTO_STORAGE_PATH", os.path.join(app.instance_path, "photos"))
+        app.config.setdefault("PHOTO_BASE_URL", "/photos/files")
+        app.config.setdefault("PHOTO_S3_BUCKET", None)
+        app.config.setdefault("PHOTO_S3_PREFIX", "")
+        app.config.setdefault("PHOTO_S3_BASE_URL", None)
+        app.config.setdefault("PHOTO_S3_ENDPOINT_URL", None)
+        app.config.setdefault("PHOTO_MAX_BYTES", 20 * 1024 * 1024)
+        app.config.setdefault("PHOTO_FILE_MAX_AGE", 365 * 24 * 3600)
+
+        kind = app.config["PHOTO_STORAGE"]
+        if kind == "local":
+            self.backend = LocalStorage(app.config["PHOTO_STORAGE_PATH"], app.config["PHOTO_BASE_URL"])
+        elif kind == "s3":
+            if not app.config["PHOTO_S3_BUCKET"]:
+                raise RuntimeError("PHOTO_STORAGE='s3' requires PHOTO_S3_BUCKET.")
+            self.backend = S3Storage(
+                app.config["PHOTO_S3_BUCKET"], app.config["PHOTO_S3_PREFIX"],
+                app.config["PHOTO_S3_BASE_URL"], app.config["PHOTO_S3_ENDPOINT_URL"],
+            )
+        else:
+            raise RuntimeError(f"Unknown PHOTO_STORAGE '{kind}'.")
+        self.max_bytes = app.config["PHOTO_MAX_BYTES"]
+        app.extensions["photo_storage"] = self
+
+    def save_upload(self, stream, entry_id):
+        """
+        Stream an uploaded image into storage. Returns (key, content_type,
+        size). Raise UnsupportedImage or UploadTooLarge.
+        """
+        head = stream.read(16)
+        content_type, extension = sniff_image(head)
+        key = f"photos/{entry_id}/{uuid.uuid4().hex}.{extension}"
+        reader = LimitedReader(stream, self.max_bytes, head)
+        self.backend.save(key, reader, content_type)
+        return key, content_type, reader.count
+
+    def delete_many(self, keys):
+        """
+        Best-effort removal of stored files; the rows are already gone, so a
+        failure is logged rather than raised.
+        """
+        for key in keys:
+            try:
+                self.backend.delete(key)
+            except Exception:
+                current_app.logger.exception("Could not delete stored file %s", key)
+
+    def url(self, key):
+        return self.backend.url(key)
+
+    def open(self, key):
+        return self.backend.open(key)
+
+    def save(self, key, stream, content_type=None):
+        self.backend.save(key, stream, content_type)
+
+
+def thumbnail_key(storage_key, size):
+    return f"{os.path.splitext(storage_key)[0]}_{size}.jpg"
+
+
+def photo_file_keys(condition):
+    """
+    Storage keys of the originals and thumbnails of the photos matching
+    `condition`. Read before deleting the rows; pass the result to
+    storage.delete_many() after the commit.
+    """
+    keys = []
+    for key, thumbnails in db.session.execute(
+        db.select(Photo.storage_key, Photo.thumbnails).where(Photo.storage_key.isnot(None), condition)
+    ):
+        keys.append(key)
+        keys += [thumbnail_key(key, size) for size in thumbnails or {}]
+    return keys
+
+
+storage = PhotoStorage()
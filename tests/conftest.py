@@ -0,0 +1,65 @@
+import os
+import tempfile
+from datetime import date
+
+import pytest
+
+# Config reads the environment when it is first imported, so this runs
+# before anything imports main.
+_tmp = tempfile.mkdtemp(prefix="travel-journal-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    CACHE_TYPE="null",
+    RATELIMIT_ENABLED="0",
+    PASSWORD_HASH_EXECUTOR="thread",
+    PHOTO_PROCESSING="inline",
+    PHOTO_STORAGE_PATH=os.path.join(_tmp, "photos"),
+    PROFILING_ENABLED="1",
+    PROFILING_ENFORCE_BUDGET="1",
+)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from main import app
+    from extensions import db
+
+    app.testing = True
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope="session")
+def seeded(app):
+    """
+    Two users sharing three trips with four entries each and two photos per
+    entry: enough rows that one query per row would stand out.
+    """
+    from extensions import db
+    from models import User, Trip, UserTrip, Entry, Photo
+    import stats
+
+    with app.app_context():
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x") for i in range(2)]
+        db.session.add_all(users)
+        for t in range(3):
+            trip = Trip(title=f"Trip {t}", start_date=date(2024, 5, 1), end_date=date(2024, 5, 9), location="Kyoto")
+            db.session.add(trip)
+            db.session.flush()
+            db.session.add_all(UserTrip(user_id=user.id, trip_id=trip.id) for user in users)
+            for e in range(4):
+                entry = Entry(trip_id=trip.id, date=date(2024, 5, 1 + e), title=f"Day {e}", content="Temples.")
+                db.session.add(entry)
+                db.session.flush()
+                db.session.add_all(Photo(entry_id=entry.id, url=f"https://example.com/{entry.id}/{p}.jpg") for p in range(2))
+        db.session.commit()
+        stats.rebuild()
+        return {"user_id": users[0].id, "trip_id": 1}
@@ -0,0 +1,26 @@
+import gzip
+import json
+
+from flask import Flask, jsonify
+
+from compression import ResponseCompressor
+
+
+def test_compressed_body_is_the_rendered_body():
+    # Two different bodies under one ETag: the second gzip response must
+    # still be the second body, not the first one's compressed copy.
+    app = Flask(__name__)
+    ResponseCompressor().init_app(app)
+    bodies = iter([{"items": ["a"] * 500, "next_cursor": None}, {"items": ["a"] * 500, "next_cursor": "WzJd"}])
+
+    @app.get("/page")
+    def page():
+        response = jsonify(next(bodies))
+        response.set_etag("same")
+        return response
+
+    client = app.test_client()
+    for expected in (None, "WzJd"):
+        response = client.get("/page", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.get_data()))["next_cursor"] == expected
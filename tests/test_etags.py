@@ -0,0 +1,97 @@
+"""
+Conditional GET: every JSON read endpoint sends an ETag and answers a
+matching If-None-Match with 304, and the tag changes with the data.
+"""
+import pytest
+
+PATHS = [
+    "/users/",
+    "/users/{user_id}/trips",
+    "/users/{user_id}/stats",
+    "/users/{user_id}/calendar?granularity=day",
+    "/trips/",
+    "/trips/nearby?lat=35.01&lon=135.77",
+    "/trips/{trip_id}",
+    "/trips/{trip_id}/entries",
+    "/trips/{trip_id}/users",
+    "/trips/{trip_id}/stats",
+    "/entries/",
+    "/photos/",
+]
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_matching_etag_gets_304(client, seeded, path):
+    path = path.format(**seeded)
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+
+    again = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert again.get_data() == b""
+
+
+def test_new_entry_changes_user_and_trip_etags(client, seeded):
+    paths = [
+        path.format(**seeded) for path in (
+            "/users/{user_id}/trips", "/users/{user_id}/stats",
+            "/users/{user_id}/calendar?granularity=day", "/trips/{trip_id}/stats",
+        )
+    ]
+    before = {path: client.get(path).headers["ETag"] for path in paths}
+
+    created = client.post("/entries/", json={
+        "trip_id": seeded["trip_id"], "date": "2024-05-09", "title": "Last day", "content": "Packing.",
+    })
+    assert created.status_code == 201
+
+    for path in paths:
+        response = client.get(path, headers={"If-None-Match": before[path]})
+        assert response.status_code == 200, path
+        assert response.headers["ETag"] != before[path]
+
+
+def test_row_after_full_last_page_changes_etag(client, seeded):
+    total = len(client.get("/trips/?limit=500").get_json()["trips"])
+    path = f"/trips/?limit={total}"
+    first = client.get(path)
+    assert first.get_json()["next_cursor"] is None
+
+    created = client.post("/trips/", json={
+        "title": "Later", "start_date": "2024-07-01", "end_date": "2024-07-02", "location": "Osaka",
+    })
+    assert created.status_code == 201
+
+    response = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.get_json()["next_cursor"] is not None
+
+
+def test_swapped_traveller_changes_expand_users_etag(app, client, seeded):
+    from extensions import db
+    from models import User
+
+    with app.app_context():
+        newest = User(username="newest", email="newest@example.com", password_hash="x")
+        db.session.add(newest)
+        db.session.commit()
+        newest_id = newest.id
+    trip = client.post("/trips/", json={
+        "title": "Swap", "start_date": "2024-08-01", "end_date": "2024-08-02", "location": "Kobe",
+    }).get_json()["trip"]
+    first, second = seeded["user_id"], seeded["user_id"] + 1
+    for user_id in (newest_id, first):
+        assert client.post(f"/trips/{trip['id']}/users", json={"user_id": user_id}).status_code == 201
+
+    path = f"/trips/{trip['id']}?expand=users"
+    before = client.get(path)
+
+    # SQLite hands the deleted link's id to the new one, and the newest user
+    # stays, so count, max(id) and max(updated_at) are all unchanged.
+    assert client.delete(f"/trips/{trip['id']}/users/{first}").status_code == 200
+    assert client.post(f"/trips/{trip['id']}/users", json={"user_id": second}).status_code == 201
+
+    response = client.get(path, headers={"If-None-Match": before.headers["ETag"]})
+    assert response.status_code == 200
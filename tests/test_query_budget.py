@@ -0,0 +1,40 @@
+"""
+N+1 regression guard: every read endpoint runs a fixed number of SQL
+statements, however many rows it returns. The profiler raises
+QueryBudgetExceeded (PROFILING_ENFORCE_BUDGET, see conftest) when a
+request runs more than its budget.
+"""
+import pytest
+
+from instrumentation import QueryBudgetExceeded
+
+# path template -> most statements the request may run
+BUDGETS = {
+    "/users/": 2,
+    "/users/{user_id}/trips": 3,
+    "/users/{user_id}/stats": 2,
+    "/users/{user_id}/calendar": 2,
+    "/trips/": 2,
+    "/trips/nearby?lat=35.01&lon=135.77": 1,
+    "/trips/{trip_id}": 2,
+    "/trips/{trip_id}?expand=entries": 4,
+    "/trips/{trip_id}?expand=entries,photos,users": 8,
+    "/trips/{trip_id}/entries": 3,
+    "/trips/{trip_id}/users": 3,
+    "/trips/{trip_id}/stats": 2,
+    "/entries/": 2,
+    "/photos/": 2,
+}
+
+
+@pytest.mark.parametrize("path, budget", BUDGETS.items())
+def test_read_endpoint_within_budget(app, client, seeded, monkeypatch, path, budget):
+    monkeypatch.setitem(app.config, "PROFILING_QUERY_BUDGET", budget)
+    response = client.get(path.format(**seeded))
+    assert response.status_code == 200
+
+
+def test_budget_overrun_fails_the_request(app, client, seeded, monkeypatch):
+    monkeypatch.setitem(app.config, "PROFILING_QUERY_BUDGET", 1)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get(f"/trips/{seeded['trip_id']}?expand=entries,photos,users")
@@ -0,0 +1,37 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from serialization import OrjsonProvider
+
+pytest.importorskip("orjson")
+
+OBJ = {
+    "title": "Café in Kyoto", "id": 7, "score": 1e-07, "big": 2 ** 70, "ratio": 0.5,
+    "date": date(2024, 5, 1), "taken_at": datetime(2024, 5, 1, 10, 20, 30),
+    "price": Decimal("3.10"), "tags": ["a", "b"], "nested": {"z": 1, "a": None},
+}
+
+KWARGS = [
+    {},
+    {"separators": (",", ":")},
+    {"separators": [",", ":"]},
+    {"indent": 2},
+    {"indent": 4},
+    {"indent": 2, "separators": (",", ":")},
+    {"separators": (", ", ": ")},
+    {"sort_keys": False, "separators": (",", ":")},
+    {"ensure_ascii": False, "separators": (",", ":")},
+    {"allow_nan": False, "separators": (",", ":")},
+]
+
+
+@pytest.mark.parametrize("obj", [OBJ, {"title": "ascii only", "n": [1, 2.5, True]}])
+@pytest.mark.parametrize("kwargs", KWARGS)
+def test_dumps_matches_default_provider(obj, kwargs):
+    app = Flask(__name__)
+    expected = DefaultJSONProvider(app).dumps(obj, **kwargs)
+    assert OrjsonProvider(app).dumps(obj, **kwargs) == expected
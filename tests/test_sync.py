@@ -0,0 +1,41 @@
+from models import Change
+
+
+def sync(client, since):
+    response = client.get(f"/sync?since={since}")
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_deleting_a_trip_logs_its_entries_and_photos(client, seeded):
+    trip = client.post("/trips/", json={
+        "title": "Day trip", "start_date": "2024-06-01", "end_date": "2024-06-01", "location": "Nara",
+    }).get_json()["trip"]
+    entry = client.post("/entries/", json={
+        "trip_id": trip["id"], "date": "2024-06-01", "title": "Deer", "content": "Many.",
+    }).get_json()["entry"]
+    photo = client.post("/photos/", json={
+        "entry_id": entry["id"], "url": "https://example.com/deer.jpg",
+    }).get_json()["photo"]
+
+    # Only the delete is in the window, so the ids must come from its log rows.
+    since = sync(client, 0)["next_since"]
+    assert client.delete(f"/trips/{trip['id']}").status_code == 200
+    changes = sync(client, since)
+    assert changes["trips"]["deleted"] == [trip["id"]]
+    assert changes["entries"]["deleted"] == [entry["id"]]
+    assert changes["photos"]["deleted"] == [photo["id"]]
+
+
+def test_rolled_back_writes_are_not_logged(app, client, seeded):
+    from extensions import db
+    from models import Trip
+    import changelog
+
+    with app.app_context():
+        logged = db.session.query(Change).count()
+        db.session.get(Trip, seeded["trip_id"]).title = "Renamed"
+        db.session.flush()
+        changelog.record("entries", [1, 2])
+        db.session.rollback()
+        assert db.session.query(Change).count() == logged
@@ -0,0 +1,260 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, update
+
+from concurrency import run_cpu_bound
+from extensions import db, cache
+from geo import located
+import changelog
+from models import Entry, Photo
+from storage import storage, thumbnail_key
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency, uploads stay "pending" without it
+    Image = ImageOps = None
+
+EXIF_IFD, GPS_IFD = 0x8769, 0x8825
+DATETIME_ORIGINAL, DATETIME = 36867, 306
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+ORIENTATION = 274
+
+
+# ----------------------------
+# Image processing
+# ----------------------------
+def gps_degrees(value, ref):
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    result = degrees + minutes / 60 + seconds / 3600
+    return -result if ref in ("S", "W") else result
+
+
+def read_metadata(image):
+    """
+    Dimensions (as displayed, after EXIF rotation), capture time and GPS
+    position of an opened image. Missing or malformed tags are None.
+    """
+    exif = image.getexif()
+    width, height = image.size
+    if exif.get(ORIENTATION) in (5, 6, 7, 8):
+        width, height = height, width
+
+    taken_at = None
+    raw = exif.get_ifd(EXIF_IFD).get(DATETIME_ORIGINAL) or exif.get(DATETIME)
+    if isinstance(raw, str):
+        try:
+            taken_at = datetime.strptime(raw.strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            pass
+
+    gps = exif.get_ifd(GPS_IFD)
+    latitude = gps_degrees(gps.get(GPS_LATITUDE), gps.get(GPS_LATITUDE_REF))
+    longitude = gps_degrees(gps.get(GPS_LONGITUDE), gps.get(GPS_LONGITUDE_REF))
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        latitude = longitude = None
+
+    return {"width": width, "height": height, "taken_at": taken_at, "latitude": latitude, "longitude": longitude}
+
+
+def render_thumbnails(image, sizes, quality=80):
+    """
+    JPEG bytes of the image scaled to fit each size (longest edge); images
+    are never scaled up. Largest first, each one scaled down from the
+    previous, which is much cheaper than from the original.
+    """
+    # JPEG can decode straight to a 1/2, 1/4 or 1/8 scale that is still at
+    # least as large as the biggest thumbnail.
+    image.draft("RGB", (max(sizes), max(sizes)))
+    current = ImageOps.exif_transpose(image)
+    if current.mode not in ("RGB", "L"):
+        current = current.convert("RGB")
+
+    rendered = {}
+    for size in sorted(sizes, reverse=True):
+        current = current.copy()
+        current.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        current.save(buffer, "JPEG", quality=quality, optimize=True)
+        rendered[size] = buffer.getvalue()
+    return rendered
+
+
+# ----------------------------
+# Background processing
+# ----------------------------
+class PhotoProcessor:
+    """
+    Generates thumbnails and reads EXIF metadata for uploaded photos in a
+    pool of PHOTO_WORKERS threads, after the upload request has returned.
+    Pillow releases the GIL while decoding and resizing, so threads scale;
+    in a gevent worker the decoding runs on gevent's native threads.
+
+    Work is not persisted: photos left "pending" by a restart (or uploaded
+    before Pillow was installed) are picked up by `flask photos process`.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.kind = "inline"
+        self.workers = 1
+        self.sizes = ()
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("PHOTO_THUMBNAIL_SIZES", "160,480,1024")
+        app.config.setdefault("PHOTO_PROCESSING", "thread")
+        app.config.setdefault("PHOTO_WORKERS", 2)
+
+        kind = app.config["PHOTO_PROCESSING"]
+        if kind not in ("thread", "inline"):
+            raise RuntimeError(f"Unknown PHOTO_PROCESSING '{kind}'.")
+        self.app = app
+        self.kind = kind
+        self.workers = max(int(app.config["PHOTO_WORKERS"]), 1)
+        self.sizes = tuple(sorted(int(size) for size in str(app.config["PHOTO_THUMBNAIL_SIZES"]).split(",")))
+        app.extensions["photo_processor"] = self
+        if not self.available:
+            app.logger.warning("Pillow is not installed: uploaded photos will stay 'pending' without thumbnails.")
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def executor(self):
+        # Created on first use and again after a fork, like the password pool.
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="photo-processing")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def submit(self, photo_id):
+        """
+        Queue a photo for processing; call after the upload is committed.
+        """
+        if not self.available:
+            return None
+        if self.kind == "inline":
+            return self._run(photo_id)
+        return self.executor().submit(self._run, photo_id)
+
+    def _run(self, photo_id):
+        with self.app.app_context():
+            try:
+                return self.process(photo_id)
+            except Exception:
+                current_app.logger.exception("Processing photo %s failed", photo_id)
+                db.session.rollback()
+                return self._fail(photo_id)
+
+    def _fail(self, photo_id):
+        row = db.session.execute(
+            select(Photo.storage_key, Entry.trip_id).join(Entry, Entry.id == Photo.entry_id).where(Photo.id == photo_id)
+        ).first()
+        result = db.session.execute(
+            update(Photo).where(Photo.id == photo_id).values(status="failed", thumbnails=None)
+        )
+        if result.rowcount:
+            changelog.record("photos", [photo_id])
+        db.session.commit()
+        if row is None:
+            return "failed"
+
+        # Thumbnails written before the failure are not referenced by the row.
+        if row.storage_key is not None:
+            storage.delete_many(thumbnail_key(row.storage_key, size) for size in self.sizes)
+        cache.invalidate("photos", f"photo:{photo_id}", f"trip:{row.trip_id}")
+        return "failed"
+
+    def _decode(self, fh):
+        image = Image.open(fh)
+        return read_metadata(image), render_thumbnails(image, self.sizes)
+
+    def process(self, photo_id):
+        """
+        Read metadata and write thumbnails for one stored photo. Returns the
+        new status, or None if the photo is gone or has no stored file.
+        """
+        row = db.session.execute(
+            select(Photo.storage_key, Entry.trip_id).join(Entry, Entry.id == Photo.entry_id).where(Photo.id == photo_id)
+        ).first()
+        if row is None or row.storage_key is None:
+            return None
+        # Release the connection while the image is decoded.
+        db.session.rollback()
+
+        with storage.open(row.storage_key) as fh:
+            metadata, rendered = run_cpu_bound(self._decode, fh)
+
+        thumbnails = {}
+        for size, body in rendered.items():
+            key = thumbnail_key(row.storage_key, size)
+            storage.save(key, io.BytesIO(body), "image/jpeg")
+            thumbnails[str(size)] = storage.url(key)
+
+        # Without EXIF GPS, keep coordinates the client may have set meanwhile.
+        point = metadata.pop("latitude"), metadata.pop("longitude")
+        if None not in point:
+            metadata.update(located(point))
+        result = db.session.execute(
+            update(Photo).where(Photo.id == photo_id).values(status="ready", thumbnails=thumbnails, **metadata)
+        )
+        if result.rowcount:
+            changelog.record("photos", [photo_id])
+        db.session.commit()
+        if result.rowcount == 0:
+            # Deleted while it was being processed.
+            storage.delete_many(thumbnail_key(row.storage_key, size) for size in rendered)
+            return None
+
+        cache.invalidate("photos", f"photo:{photo_id}", f"trip:{row.trip_id}")
+        return "ready"
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+photos_cli = AppGroup("photos", help="Process uploaded photos.")
+
+
+@photos_cli.command("process")
+@click.option("--photo-id", "photo_ids", type=int, multiple=True, help="Only process these photos (repeatable).")
+@click.option("--failed", is_flag=True, help="Also retry photos whose processing failed.")
+def process_command(photo_ids, failed):
+    """Generate thumbnails and metadata for pending uploads."""
+    if not processor.available:
+        raise click.ClickException("Photo processing requires the 'Pillow' package.")
+    query = select(Photo.id).where(Photo.storage_key.isnot(None))
+    if photo_ids:
+        query = query.where(Photo.id.in_(photo_ids))
+    else:
+        query = query.where(Photo.status.in_(["pending", "failed"] if failed else ["pending"]))
+    ids = db.session.scalars(query.order_by(Photo.id)).all()
+    db.session.rollback()
+
+    outcomes = {}
+    for photo_id in ids:
+        status = processor._run(photo_id)
+        outcomes[status] = outcomes.get(status, 0) + 1
+    click.echo(f"Processed {len(ids)} photos: {outcomes.get('ready', 0)} ready, {outcomes.get('failed', 0)} failed.")
+
+
+processor = PhotoProcessor()
@@ -1,5 +1,18 @@
-from flask import jsonify
+import base64
+import hashlib
+import json
+import math
+from flask import Response, current_app, jsonify, request, stream_with_context
 from datetime import datetime, date
+from sqlalchemy import Date, and_, or_
+from extensions import db
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 1000
 
 
 def error_response(message, status_code=400):
@@ -13,11 +26,289 @@ def validate_fields(data, required_fields):
     return True, None
 
 
-def parse_date(value: str, field_name: str):
+def parse_date(value: str, field_name: str, allow_range=False):
     """
     Parse ISO date (YYYY-MM-DD). Raise ValueError with a helpful message.
+
+    With allow_range, also accept "YYYY-MM-DD..YYYY-MM-DD" (inclusive, either
+    end may be left open) and return a (start, end) tuple; a single date is
+    the range of that one day.
     """
+    if allow_range:
+        start, sep, end = (value or "").partition("..")
+        try:
+            if not sep:
+                day = datetime.strptime(start, "%Y-%m-%d").date()
+                return day, day
+            start = datetime.strptime(start, "%Y-%m-%d").date() if start else None
+            end = datetime.strptime(end, "%Y-%m-%d").date() if end else None
+        except Exception:
+            raise ValueError(
+                f"Field '{field_name}' must be an ISO date 'YYYY-MM-DD' or range 'YYYY-MM-DD..YYYY-MM-DD'."
+            )
+        if start is None and end is None:
+            raise ValueError(f"Field '{field_name}' needs at least one end of the range.")
+        if start and end and end < start:
+            raise ValueError(f"Field '{field_name}' ends before it starts.")
+        return start, end
+
     try:
         return datetime.strptime(value, "%Y-%m-%d").date()
     except Exception:
         raise ValueError(f"Field '{field_name}' must be an ISO date string 'YYYY-MM-DD'.")
+
+
+def parse_int_arg(name):
+    """
+    Read an optional integer query parameter. Raise ValueError if it is not an integer.
+    """
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Parameter '{name}' must be an integer.")
+
+
+def parse_float_arg(name):
+    """
+    Read an optional number query parameter. Raise ValueError if it is not a number.
+    """
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        number = math.nan
+    if not math.isfinite(number):
+        raise ValueError(f"Parameter '{name}' must be a number.")
+    return number
+
+
+def parse_date_window():
+    """
+    Read optional 'from' and 'to' ISO dates (inclusive) from the query string,
+    or the same window as one 'date' range ("YYYY-MM-DD..YYYY-MM-DD").
+    """
+    if request.args.get("date"):
+        if request.args.get("from") or request.args.get("to"):
+            raise ValueError("Parameter 'date' cannot be combined with 'from' or 'to'.")
+        return parse_date(request.args["date"], "date", allow_range=True)
+    start = parse_date(request.args["from"], "from") if request.args.get("from") else None
+    end = parse_date(request.args["to"], "to") if request.args.get("to") else None
+    if start and end and end < start:
+        raise ValueError("Parameter 'to' cannot be earlier than 'from'.")
+    return start, end
+
+
+def parse_fields(model):
+    """
+    Read the optional 'fields' query parameter ("id,title,date") as a tuple of
+    the model's json_fields, or None for all of them. Raise ValueError for
+    names the model does not serialize.
+    """
+    value = request.args.get("fields")
+    if not value:
+        return None
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    if not names:
+        raise ValueError("Parameter 'fields' must name at least one field.")
+    unknown = names.difference(model.json_fields)
+    if unknown:
+        raise ValueError(
+            f"Parameter 'fields' has unknown fields: {', '.join(sorted(unknown))}. "
+            f"Available: {', '.join(model.json_fields)}."
+        )
+    return tuple(name for name in model.json_fields if name in names)
+
+
+# ----------------------------
+# Bulk requests
+# ----------------------------
+def read_bulk_items():
+    """
+    Read a JSON array from the request body for a /bulk endpoint.
+    Raise ValueError if it is missing, not an array or too large.
+    """
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        raise ValueError("Request body must be a non-empty JSON array.")
+    max_items = current_app.config["BULK_MAX_ITEMS"]
+    if len(items) > max_items:
+        raise ValueError(f"At most {max_items} items can be sent in one request.")
+    return items
+
+
+def bulk_error(index, message, status_code=400):
+    return {"index": index, "status": status_code, "error": message}
+
+
+def as_id(value):
+    """
+    Coerce a JSON id (int or numeric string) to int, or return None.
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def existing_ids(model, ids):
+    """
+    Return the subset of ids that exist for the model, using one IN query.
+    """
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return set()
+    return set(db.session.scalars(db.select(model.id).where(model.id.in_(ids))))
+
+
+# ----------------------------
+# Keyset pagination
+# ----------------------------
+def encode_cursor(values):
+    """
+    Encode the sort key of the last row on a page into an opaque token.
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, date) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, columns):
+    """
+    Decode a cursor produced by encode_cursor back into typed column values.
+    Raise ValueError if the token is malformed or was issued for other columns.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [
+            parse_date(v, "after") if isinstance(c.type, Date) else int(v)
+            for c, v in zip(columns, values)
+        ]
+    except Exception:
+        raise ValueError("Parameter 'after' is not a valid cursor.")
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value in (None, ""):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Parameter 'limit' must be an integer.")
+    if limit < 1:
+        raise ValueError("Parameter 'limit' must be at least 1.")
+    return min(limit, maximum)
+
+
+def keyset_filter(columns, values):
+    """
+    Build "(c1, c2, ...) > (v1, v2, ...)" without relying on row-value support,
+    so the predicate can use a composite index on every backend.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+
+def paginate(query, columns):
+    """
+    Apply keyset pagination to a query ordered by the given columns, reading
+    'limit' and 'after' from the request. Returns (rows, next_cursor).
+    Raise ValueError for bad parameters.
+    """
+    limit = parse_limit(request.args.get("limit"))
+    after = request.args.get("after")
+    if after:
+        query = query.filter(keyset_filter(columns, decode_cursor(after, columns)))
+
+    rows = query.order_by(*columns).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in columns])
+
+
+# ----------------------------
+# NDJSON streaming
+# ----------------------------
+def wants_ndjson():
+    """
+    True when the client asked for a streamed export, either with ?stream=1
+    or with 'Accept: application/x-ndjson'.
+    """
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_response(query, serialize=lambda obj: obj.to_dict()):
+    """
+    Stream every row of the query as one JSON document per line.
+    Rows are fetched in batches through a server-side cursor (yield_per),
+    so memory stays flat regardless of the table size.
+    """
+    rows = query.yield_per(STREAM_BATCH_SIZE)
+    dumps = current_app.json.dumps
+
+    def generate():
+        for row in rows:
+            yield dumps(serialize(row), separators=(",", ":")) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+# ----------------------------
+# Conditional GET
+# ----------------------------
+def make_etag(*validators):
+    """
+    Build a strong ETag from cheap validators (ids, updated_at values, counts).
+    The request path and query string are mixed in, so every representation
+    of a resource (page, filter, expand) gets its own tag.
+    """
+    raw = repr((request.full_path, validators)).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def not_modified(etag):
+    """
+    Return a 304 response if the client already holds this ETag, else None.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(rv, etag):
+    response = current_app.make_response(rv)
+    response.set_etag(etag)
+    return response
+
+
+def page_etag(query, columns, model, *validators):
+    """
+    ETag for one keyset page, computed from the (sort key, id, updated_at)
+    of its rows only, so it never loads or serializes the full rows.
+    Extra `validators` columns (e.g. counts from a joined summary table) are
+    read along with them.
+    """
+    names = {c.key for c in columns}
+    extra = [c for c in (model.id, model.updated_at) if c.key not in names] + list(validators)
+    # next_cursor is part of the body: a row added after a full last page
+    # turns its null cursor into a real one.
+    rows, next_cursor = paginate(query.with_entities(*columns, *extra), columns)
+    return make_etag(next_cursor, *(tuple(row) for row in rows))